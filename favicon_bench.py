@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark for favicon_tool.py: builds synthetic asset folders and times each stage of the pipeline.
+Usage:
+  python3 favicon_bench.py                          # 200 files, default format mix, print a table
+  python3 favicon_bench.py --files 2000 --jobs 0    # Bigger corpus, one resize worker per CPU
+  python3 favicon_bench.py --mix png=1,svg=1 --max-size 4096
+  python3 favicon_bench.py --out run.json           # Write machine-readable results
+  python3 favicon_bench.py --baseline run.json      # Compare against an earlier run (exit 1 on regression)
+Stages: cold (--force), warm (--check), delete (--delete F, which regenerates), render (in-process Page.write:
+index shards, meta, HTML and its .gz, into an empty folder each time).
+Each CLI stage runs favicon_tool.py in a fresh process inside the corpus folder, like a user would.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+TOOL = SCRIPT_DIR / "favicon_tool.py"
+DEFAULT_MIX = "png=4,jpg=3,webp=2,svg=1"
+# Source edge lengths are drawn from this ladder, capped at --max-size
+SIDES = (32, 64, 256, 512, 1024, 2048, 4096)
+SVG_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" width="{s}" height="{s}" viewBox="0 0 {s} {s}">
+<rect width="{s}" height="{s}" rx="{r}" fill="#{c1:06x}"/><circle cx="{h}" cy="{h}" r="{r}" fill="#{c2:06x}"/>
+</svg>
+"""
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        ext, _, weight = part.partition("=")
+        ext = ext.strip().lower()
+        if ext not in ("png", "jpg", "webp", "svg"):
+            raise argparse.ArgumentTypeError(f"unknown format {ext!r} (png, jpg, webp, svg)")
+        try:
+            mix[ext] = int(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight in {part!r}")
+    return mix
+
+
+def make_corpus(folder: Path, files: int, mix: dict[str, int], max_size: int, seed: int) -> None:
+    rng = random.Random(seed)
+    exts = [e for e in mix for _ in range(mix[e])]
+    sides = [s for s in SIDES if s <= max_size] or [max_size]
+    if Image is None and any(e != "svg" for e in exts):
+        raise SystemExit("Install Pillow to generate raster corpora: pip install Pillow")
+    for i in range(files):
+        ext, side = rng.choice(exts), rng.choice(sides)
+        # Names do not start with favicon-, so the cold run also pays for renaming
+        path = folder / f"upload-{i:05d}.{ext}"
+        if ext == "svg":
+            path.write_text(SVG_TEMPLATE.format(s=side, h=side // 2, r=side // 4, c1=rng.getrandbits(24), c2=rng.getrandbits(24)))
+            continue
+        # Noise decodes like a photo rather than a flat fill, which would flatter the codecs
+        im = Image.merge("RGB", [Image.effect_noise((side, side), rng.randint(20, 90)) for _ in range(3)])
+        im.save(path, {"jpg": "JPEG", "png": "PNG", "webp": "WEBP"}[ext])
+
+
+def run_tool(folder: Path, *args: str) -> tuple[float, int]:
+    # wait4 gives the child's own rusage, so peak RSS is per stage rather than per benchmark process
+    with tempfile.TemporaryFile() as err:
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "favicon_tool.py", *args], cwd=folder, stdout=subprocess.DEVNULL, stderr=err)
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - started
+        if os.waitstatus_to_exitcode(status) != 0:
+            err.seek(0)
+            raise SystemExit(f"favicon_tool.py {' '.join(args)} failed: {err.read().decode(errors='replace')}")
+    rss_kb = usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+    return elapsed, rss_kb
+
+
+def time_render(folder: Path, min_runs: int = 5, min_seconds: float = 0.5) -> list[float]:
+    # Import the copy inside the corpus so its SCRIPT_DIR points there. Versions come from the real manifest.
+    spec = importlib.util.spec_from_file_location("favicon_tool_bench", folder / "favicon_tool.py")
+    tool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool)
+    entries = tool.load_manifest()
+    names = [p.name for p in tool.collect_sources() if p.name in entries]
+    versions = {n: tool.asset_version(entries, n) for n in names}
+    as_is = {n for n in names if tool.is_shown_as_is(entries, n)}
+    # Each write goes to an empty folder so no shard is skipped as unchanged; repeat until well above timer noise
+    timings: list[float] = []
+    while len(timings) < min_runs or sum(timings) < min_seconds:
+        with tempfile.TemporaryDirectory(prefix="favicon-bench-render-") as out:
+            tool.SCRIPT_DIR = Path(out)
+            started = time.perf_counter()
+            page = tool.Page()
+            page.sync(versions, as_is)
+            page.write()
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings: list[float], files: int, rss: list[int]) -> dict:
+    best = min(timings)
+    return {
+        "seconds_best": round(best, 6),
+        "seconds_median": round(statistics.median(timings), 6),
+        "files_per_sec": round(files / best, 1) if best > 0 else None,
+        "peak_rss_kb": max(rss) if rss else None,
+        "runs": len(timings),
+    }
+
+
+def bench(args: argparse.Namespace) -> dict:
+    jobs = ["--jobs", str(args.jobs)]
+    stages: dict[str, dict] = {}
+    cold, cold_rss, warm, warm_rss, delete, delete_rss = [], [], [], [], [], []
+    render: list[float] = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory(prefix="favicon-bench-") as tmp:
+            folder = Path(tmp)
+            make_corpus(folder, args.files, args.mix, args.max_size, args.seed)
+            shutil.copy(TOOL, folder / "favicon_tool.py")
+            t, rss = run_tool(folder, "--force", *jobs)
+            cold.append(t)
+            cold_rss.append(rss)
+            t, rss = run_tool(folder, "--check", *jobs)
+            warm.append(t)
+            warm_rss.append(rss)
+            victim = sorted(folder.glob("favicon-test-*.*"))[0].name
+            t, rss = run_tool(folder, "--delete", victim, "--check", *jobs)
+            delete.append(t)
+            delete_rss.append(rss)
+            render += time_render(folder)
+    stages["cold"] = summarize(cold, args.files, cold_rss)
+    stages["warm"] = summarize(warm, args.files, warm_rss)
+    stages["delete"] = summarize(delete, args.files - 1, delete_rss)
+    stages["render"] = summarize(render, args.files - 1, [])
+    return {
+        "meta": {
+            "files": args.files,
+            "mix": args.mix,
+            "max_size": args.max_size,
+            "jobs": args.jobs,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pillow": getattr(sys.modules.get("PIL"), "__version__", None),
+            "cpus": os.cpu_count(),
+            "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "stages": stages,
+    }
+
+
+# Corpus settings that must match for timings to be comparable
+COMPARABLE = ("files", "mix", "max_size", "jobs", "seed")
+# Slowdowns smaller than this many seconds are timer and scheduler noise, whatever the ratio
+NOISE_FLOOR = 0.002
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> bool:
+    old_meta, meta = baseline.get("meta", {}), result["meta"]
+    differ = [k for k in COMPARABLE if old_meta.get(k) != meta[k]]
+    if differ:
+        details = ", ".join(f"{k} {old_meta.get(k)!r} vs {meta[k]!r}" for k in differ)
+        raise SystemExit(f"Baseline was run with different settings ({details}); not comparing")
+    ok = True
+    print(f"\n{'stage':<8} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for name, stage in result["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        ratio = stage["seconds_best"] / old["seconds_best"] if old["seconds_best"] else float("inf")
+        slower = stage["seconds_best"] - old["seconds_best"]
+        flag = "  REGRESSION" if ratio > threshold and slower > NOISE_FLOOR else ""
+        ok &= not flag
+        print(f"{name:<8} {old['seconds_best']:>9.4f}s {stage['seconds_best']:>9.4f}s {ratio:>6.2f}x{flag}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark favicon_tool.py on synthetic asset folders.")
+    parser.add_argument("--files", type=int, default=200, help="Files per corpus")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Format weights (default {DEFAULT_MIX})")
+    parser.add_argument("--max-size", type=int, default=1024, metavar="PX", help="Largest source edge in pixels (up to 4096)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Passed through to favicon_tool.py --jobs")
+    parser.add_argument("--repeat", type=int, default=1, metavar="N", help="Fresh corpora to run; best and median are reported")
+    parser.add_argument("--seed", type=int, default=1, help="Corpus RNG seed, so runs are comparable")
+    parser.add_argument("--out", metavar="FILE", help="Write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with an earlier --out file")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    result = bench(args)
+    print(f"{'stage':<8} {'best':>9} {'median':>9} {'files/s':>9} {'peak RSS':>10}")
+    for name, stage in result["stages"].items():
+        rss = f"{stage['peak_rss_kb'] / 1024:.1f} MB" if stage["peak_rss_kb"] else "-"
+        print(f"{name:<8} {stage['seconds_best']:>8.4f}s {stage['seconds_median']:>8.4f}s {stage['files_per_sec'] or 0:>9.1f} {rss:>10}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=1), encoding="utf-8")
+        print(f"Wrote {args.out}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if not compare(result, baseline, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,22 @@
 Favicon tool: one script to generate the tester HTML and (optional) serve it so Delete removes files from disk.
 Usage:
   python3 favicon_tool.py              # Generate favicon-tester.html
-  python3 favicon_tool.py --check      # Only regenerate if source newer
+  python3 favicon_tool.py --check      # Only regenerate if source content changed
   python3 favicon_tool.py --force      # Regenerate all
-  python3 favicon_tool.py --clean      # Remove only -16x16/-32x32
+  python3 favicon_tool.py --jobs N     # Resize with N worker processes (0 = one per CPU)
+  python3 favicon_tool.py --sizes 16,32,48,64,180,192,512  # Size tiers to generate
+  python3 favicon_tool.py --max-pixels N  # Pillow decode budget, shared by --jobs workers (bigger ones go to ImageMagick)
+  python3 favicon_tool.py --optimize   # Losslessly shrink the PNG outputs (exact palette, no metadata, max deflate)
+  python3 favicon_tool.py --atlas      # Also pack 16/32 previews into sprite sheets
+  python3 favicon_tool.py --bundle [F] # Also export favicon.ico, apple-touch/PWA icons and site.webmanifest
+  python3 favicon_tool.py --dedup      # Group near-identical icons into one row (--dedup-prune deletes the copies)
+  python3 favicon_tool.py --stats      # Print per-stage timings, resize paths and bytes read/written
+  python3 favicon_tool.py --profile F  # Also dump cProfile stats (.prof) or a Chrome trace (.json) to F
+  python3 favicon_tool.py --clean      # Remove only generated -NxN.png outputs
   python3 favicon_tool.py --clean-all  # Remove all favicon-* assets
   python3 favicon_tool.py --delete F   # Delete one asset, then regenerate
+  python3 favicon_tool.py --watch      # Generate, then rebuild changed files as they arrive
+  python3 favicon_tool.py --daemon     # JSON-RPC on stdin/stdout: scan, build, delete, render_html
   python3 favicon_tool.py --serve      # Generate, then serve at http://127.0.0.1:8765 (Delete removes files)
 Drop images/SVGs in this folder, then run. Open favicon-tester.html (or the URL when using --serve).
 """
@@ -15,10 +26,24 @@ from __future__ import annotations
 
 import argparse
 import glob
+import gzip
+import hashlib
+import heapq
+import io
+import json
 import os
 import re
+import shutil
+import stat
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
 from pathlib import Path
 
 try:
@@ -26,11 +51,76 @@ try:
 except ImportError:
     Image = None
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import cairosvg
+except (ImportError, OSError):  # OSError: the module is installed but libcairo is not
+    cairosvg = None
+
 SCRIPT_DIR = Path(__file__).resolve().parent
 EXTS = ("png", "jpg", "jpeg", "webp", "svg")
-SKIP = re.compile(r"-16x16\.|-32x32\.|favicon-tester\.|\.template\.|run\.sh|README|favicon_tool\.py")
+SKIP = re.compile(r"-16x16\.|-32x32\.|favicon-tester\.|favicon-atlas-|\.template\.|run\.sh|README|favicon_tool\.py")
 OUT_HTML = "favicon-tester.html"
+# Asset index for the tester page: a metadata file plus fixed-size JSON shards
+INDEX_META = "favicon-tester-index.json"
+INDEX_PAGE_SIZE = 500
+# Optional sprite sheets: favicon-atlas-<N>.png per size, slots laid out ATLAS_COLUMNS wide
+ATLAS_SIZES = (16, 32)
+ATLAS_COLUMNS = 64
+ATLAS_MAP = "favicon-atlas.json"
+# --bundle: deployable icon set per asset in favicon-bundle/<stem>/
+BUNDLE_DIR = "favicon-bundle"
+BUNDLE_ICO_SIZES = (16, 32, 48)
+BUNDLE_PNGS = {
+    "favicon-16x16.png": 16,
+    "favicon-32x32.png": 32,
+    "apple-touch-icon.png": 180,
+    "android-chrome-192x192.png": 192,
+    "android-chrome-512x512.png": 512,
+}
+BUNDLE_PARAMS = "bundle-v1"
+# Size tiers written per raster source as <stem>-NxN.png; 16 and 32 are always included
+SIZES = (16, 32, 48, 64)
+PREVIEW_SIZES = (16, 32, 48, 64)
+OUTPUT_RE = re.compile(r"^(favicon-.*)-(\d+)x\2\.png$")
+MANIFEST = "favicon-build.json"
+# Partial builds append changed entries here instead of rewriting MANIFEST; a full save folds it back in
+MANIFEST_LOG = "favicon-build.log"
+MANIFEST_LOG_MAX = 1 << 20
+# --dedup: two assets are the same icon when their 64-bit dHashes differ in at most DEDUP_DISTANCE bits
+# and their mean colors are within DEDUP_COLOR per channel (a flat red and a flat blue square share a dHash)
+DEDUP_DISTANCE = 4
+DEDUP_COLOR = 24
+# Bump when the resize pipeline changes so cached outputs are rebuilt
+RESIZE_PARAMS = "nearest-rgba-v3"
+# SVGs are rendered straight to each tier; bump when the renderer chain changes
+SVG_PARAMS = "svg-raster-v1"
+# ImageMagick rasterizes SVG at 96 dpi before resizing; render larger so 512px tiers stay sharp
+SVG_DENSITY = "384"
+# Largest source (in pixels) Pillow may fully decode, matching Pillow's own decompression-bomb limit; bigger
+# ones go to ImageMagick with memory limits, or are shown as-is. Each --jobs worker holds one such image at a time.
+MAX_PIXELS = 89_478_485
+# Rows that have no PNG tiers and show the source itself (SVG without a renderer, image nothing could decode)
+AS_IS_PARAMS = "as-is"
+MAGICK_LIMITS = ["-limit", "memory", "256MiB", "-limit", "map", "512MiB"]
+# --optimize: lossless PNG recompression after resizing; appended to the params so outputs are cached per mode
+OPTIMIZE = False
+OPTIMIZE_PARAMS = "png-opt-v1"
+# Served with precompressed .br/.gz siblings when the client accepts them
+PRECOMPRESS_EXTS = (".html", ".svg")
 PORT = 8765
+# Request latency buckets (seconds) for /metrics under --serve
+# --stats keeps only the slowest files and --profile only the latest trace events, so serve/watch/daemon
+# processes do not grow without bound
+STATS_TOP_FILES = 10
+TRACE_MAX_EVENTS = 200_000
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
 
 HTML_TEMPLATE = r"""<!DOCTYPE html>
 <html lang="en">
@@ -49,18 +139,23 @@ __FIRST_ICON_LINKS__
         .asset-list { display: flex; flex-direction: column; gap: 0; }
         .asset-row { display: flex; align-items: center; gap: 1rem; padding: 0.75rem 1rem; background: #16213e; border-bottom: 1px solid #2a2a4a; flex-wrap: wrap; }
         .asset-row:last-of-type { border-bottom: none; }
+        .asset-list { position: relative; }
+        .asset-list .asset-row { position: absolute; left: 0; right: 0; height: 104px; flex-wrap: nowrap; overflow: hidden; }
+        .asset-list .asset-row .actions { overflow-x: auto; }
         .asset-name { font-size: 0.8rem; color: #aaa; min-width: 140px; word-break: break-all; }
+        .asset-name .dupes { display: block; font-size: 0.7rem; color: #7a9; }
         .asset-row .sizes { display: flex; align-items: center; gap: 0.75rem; flex-wrap: nowrap; }
         .asset-row .size-cell { display: flex; flex-direction: column; align-items: center; gap: 0.2rem; background: #0f0f1a; border-radius: 6px; padding: 0.35rem; image-rendering: pixelated; image-rendering: crisp-edges; }
         .asset-row .size-cell .label { font-size: 0.65rem; color: #666; }
         .asset-row .size-cell img { display: block; vertical-align: bottom; }
+        .asset-row .size-cell .sprite { display: block; background-repeat: no-repeat; }
         .asset-row .actions { display: flex; gap: 0.5rem; margin-left: auto; flex-shrink: 0; }
         .asset-row .actions button { font-size: 0.7rem; padding: 0.3rem 0.5rem; background: #2a2a4a; color: #eaeaea; border: none; border-radius: 6px; cursor: pointer; }
         .asset-row .actions button:hover { background: #3a3a5a; }
         .asset-row .actions button.dl { background: #1a3a2a; }
         .asset-row .actions button.dl:hover { background: #2a4a3a; }
-        .asset-row .actions a.dl-svg { font-size: 0.7rem; padding: 0.3rem 0.5rem; background: #1a3a2a; color: #eaeaea; border-radius: 6px; text-decoration: none; }
-        .asset-row .actions a.dl-svg:hover { background: #2a4a3a; }
+        .asset-row .actions a.dl-svg, .asset-row .actions a.dl-png { font-size: 0.7rem; padding: 0.3rem 0.5rem; background: #1a3a2a; color: #eaeaea; border-radius: 6px; text-decoration: none; }
+        .asset-row .actions a.dl-svg:hover, .asset-row .actions a.dl-png:hover { background: #2a4a3a; }
         .asset-row .actions button.btn-delete { font-size: 0.7rem; padding: 0.3rem 0.5rem; background: #4a2a2a; color: #eaeaea; border: none; border-radius: 6px; cursor: pointer; }
         .asset-row .actions button.btn-delete:hover { background: #5a3a3a; }
         .actual-tab-section { margin-bottom: 2rem; padding-top: 1rem; border-top: 1px solid #2a2a4a; }
@@ -79,8 +174,9 @@ __FIRST_ICON_LINKS__
     <p class="sub">Drop images in this folder, run <code>python3 favicon_tool.py</code> (or <code>--check</code>). Each row = one asset.</p>
     <section class="assets-section" aria-label="All assets">
         <h2>All assets — one row each, 4 sizes (16 → 32 → 48 → 64). Scroll down as you add more.</h2>
-        <div class="asset-list">
-__ASSET_ROWS__
+        <div class="asset-list"></div>
+        <div class="asset-add">
+__ADD_ROW__
         </div>
     </section>
     <section class="actual-tab-section" aria-label="Actual tab size">
@@ -91,22 +187,9 @@ __ASSET_ROWS__
             <span class="actual-tab-label">Left = real tab size · Right = 8× zoom</span>
         </div>
     </section>
-    <p class="note">Use "Use as tab" on any asset. "Delete" removes the row and copies the delete command; with <code>--serve</code>, Delete removes the file from disk. Reload after running the script.</p>
+    <p class="note">Use "Use as tab" on any asset. "Delete" removes the row and copies the delete command; with <code>--serve</code>, Delete removes the file from disk, and with <code>--serve --watch</code> the page also updates itself when assets change. Otherwise reload after running the script.</p>
+    <script type="application/json" id="asset-index">__ASSET_INDEX__</script>
     <script>
-        var q = '?t=' + Date.now();
-        (function () {
-            document.querySelectorAll('link[rel="icon"]').forEach(function (link) {
-                var h = link.getAttribute('href');
-                if (h && h.indexOf('?') === -1) link.setAttribute('href', h + q);
-            });
-            var tabActual = document.getElementById('tab-actual-16');
-            var tabZoomed = document.getElementById('tab-zoomed-16');
-            if (tabActual && tabZoomed && tabActual.src && tabActual.src.indexOf('?') === -1) { tabActual.src += q; tabZoomed.src = tabActual.src; }
-            document.querySelectorAll('.asset-row[data-asset-src] .size-cell img').forEach(function (img) {
-                var s = img.getAttribute('src');
-                if (s && s.indexOf('?') === -1) img.setAttribute('src', s + q);
-            });
-        })();
         function scaleToDataUrl(img, w, h) {
             var c = document.createElement('canvas');
             c.width = w; c.height = h;
@@ -126,7 +209,7 @@ __ASSET_ROWS__
             var dl32 = row.querySelector('.dl-32');
             var isSvg = row.getAttribute('data-svg') === 'true';
             if (useTab) useTab.addEventListener('click', function () {
-                var href = isSvg ? (row.getAttribute('data-asset-src') + q) : row._data16;
+                var href = row.getAttribute('data-icon-url') || row._data16;
                 if (!href) return;
                 var link = document.querySelector('link[rel="icon"]') || document.createElement('link');
                 link.rel = 'icon';
@@ -155,24 +238,126 @@ __ASSET_ROWS__
                 var cmd = 'python3 favicon_tool.py --delete ' + filename;
                 if (window.__FAVICON_SERVE__) {
                     fetch('/delete?file=' + encodeURIComponent(filename), { method: 'POST' }).then(function (r) {
-                        if (r.ok) row.remove();
+                        if (r.ok) removeAsset(filename);
                         else r.text().then(function (t) { alert('Delete failed: ' + t); });
                     }).catch(function (e) { alert('Delete failed: ' + e.message); });
                 } else {
-                    row.remove();
+                    removeAsset(filename);
                     if (navigator.clipboard && navigator.clipboard.writeText) navigator.clipboard.writeText(cmd);
                 }
             });
         }
-        document.querySelectorAll('.asset-row[data-asset-src]').forEach(function (row) {
+        // Rows are rendered from the asset index only while near the viewport (fixed 104px rows, see CSS),
+        // so startup cost does not grow with the number of assets.
+        var ROW_H = 104, BUFFER = 6;
+        var INDEX = JSON.parse(document.getElementById('asset-index').textContent);
+        var list = document.querySelector('.asset-list');
+        var assets = [], loading = {}, rendered = {}, pending = false;
+        var io = window.IntersectionObserver ? new IntersectionObserver(function (entries) {
+            entries.forEach(function (e) {
+                if (!e.isIntersecting) return;
+                e.target.src = e.target.getAttribute('data-src');
+                io.unobserve(e.target);
+            });
+        }, { rootMargin: '200px' }) : null;
+        function el(tag, attrs, text) {
+            var node = document.createElement(tag);
+            Object.keys(attrs).forEach(function (k) { node.setAttribute(k, attrs[k]); });
+            if (text) node.textContent = text;
+            return node;
+        }
+        function makeRow(asset) {
+            var name = asset[0], v = asset[1] ? '?v=' + asset[1] : '';
+            // Sources shown as-is have no PNG tiers: SVGs with no renderer at build time, or images over the decode budget
+            var isSvg = /\.svg$/.test(name), asIs = asset[3] === 1, base = name.replace(/\.[^.]+$/, '');
+            var out = function (n) { return base + '-' + n + 'x' + n + '.png' + v; };
+            var row = el('div', { 'class': 'asset-row', 'data-asset-src': name, 'data-icon-url': asIs ? name + v : out(16) });
+            if (asIs && isSvg) row.setAttribute('data-svg', 'true');
+            var label = row.appendChild(el('span', { 'class': 'asset-name' }, name));
+            if (asset[4]) label.appendChild(el('small', { 'class': 'dupes', title: asset[4].join('\n') }, '+' + asset[4].length + ' similar'));
+            var sizes = row.appendChild(el('div', { 'class': 'sizes' }));
+            INDEX.preview.forEach(function (p) {
+                var tier = INDEX.sizes.filter(function (n) { return n >= p; })[0];
+                var cell = sizes.appendChild(el('div', { 'class': 'size-cell' }));
+                cell.appendChild(el('span', { 'class': 'label' }, String(p)));
+                var sheet = INDEX.atlas && asset[2] != null && INDEX.atlas.sheets[p];
+                if (sheet) {
+                    // One shared sprite sheet per size instead of one request per row
+                    var col = asset[2] % INDEX.atlas.columns, line = Math.floor(asset[2] / INDEX.atlas.columns);
+                    var sprite = cell.appendChild(el('span', { 'class': 'sprite' }));
+                    sprite.style.width = sprite.style.height = p + 'px';
+                    sprite.style.backgroundImage = 'url("' + sheet + '")';
+                    sprite.style.backgroundPosition = (-col * p) + 'px ' + (-line * p) + 'px';
+                    return;
+                }
+                var img = cell.appendChild(el('img', { alt: '', width: p, height: p }));
+                var src = asIs || !tier ? name + v : out(tier);
+                if (io) { img.setAttribute('data-src', src); io.observe(img); } else img.src = src;
+            });
+            var actions = row.appendChild(el('div', { 'class': 'actions' }));
+            actions.appendChild(el('button', { type: 'button', 'class': asIs && isSvg ? 'use-tab use-tab-svg' : 'use-tab' }, 'Use as tab'));
+            actions.appendChild(el('button', { type: 'button', 'class': 'btn-delete', 'data-filename': name }, 'Delete'));
+            if (isSvg) actions.appendChild(el('a', { href: name + v, download: name, 'class': 'dl-svg' }, 'Download SVG'));
+            if (!asIs) INDEX.sizes.forEach(function (n) {
+                actions.appendChild(el('a', { href: out(n), download: 'favicon-' + n + 'x' + n + '.png', 'class': 'dl-png' }, 'Download ' + n + '×' + n));
+            });
             bindRow(row);
-            if (row.getAttribute('data-svg') === 'true') return;
-            var src = row.getAttribute('data-asset-src') + q;
-            var img = new Image();
-            img.onload = function () { fillRow(row, scaleToDataUrl(img, 16, 16), scaleToDataUrl(img, 32, 32)); };
-            img.onerror = function () { row.querySelector('.asset-name').textContent += ' (load failed)'; };
-            img.src = src;
-        });
+            row._asset = asset;
+            return row;
+        }
+        function ensurePage(p) {
+            if (INDEX.assets || loading[p]) return;
+            loading[p] = true;
+            var index = INDEX;
+            fetch(index.pages[p]).then(function (r) { return r.json(); }).then(function (data) {
+                if (index !== INDEX) return;
+                data.assets.forEach(function (a, i) { assets[p * index.pageSize + i] = a; });
+                render();
+            });
+        }
+        function render() {
+            pending = false;
+            list.style.height = (assets.length * ROW_H) + 'px';
+            var top = list.getBoundingClientRect().top;
+            var first = Math.max(0, Math.floor(-top / ROW_H) - BUFFER);
+            var last = Math.min(assets.length, Math.ceil((window.innerHeight - top) / ROW_H) + BUFFER);
+            Object.keys(rendered).forEach(function (k) {
+                var row = rendered[k];
+                if (k < first || k >= last || row._asset !== assets[k]) {
+                    row.querySelectorAll('img[data-src]').forEach(function (img) { if (io) io.unobserve(img); });
+                    row.remove();
+                    delete rendered[k];
+                }
+            });
+            for (var i = first; i < last; i++) {
+                if (rendered[i]) continue;
+                if (!assets[i]) { ensurePage(Math.floor(i / INDEX.pageSize)); continue; }
+                var row = makeRow(assets[i]);
+                row.style.top = (i * ROW_H) + 'px';
+                rendered[i] = row;
+                list.appendChild(row);
+            }
+        }
+        function scheduleRender() {
+            if (pending) return;
+            pending = true;
+            requestAnimationFrame(render);
+        }
+        function setIndex(index) {
+            INDEX = index;
+            assets = index.assets ? index.assets.slice() : new Array(index.total);
+            loading = {};
+            render();
+        }
+        function removeAsset(name) {
+            for (var i = 0; i < assets.length; i++) {
+                if (assets[i] && assets[i][0] === name) { assets.splice(i, 1); break; }
+            }
+            render();
+        }
+        window.addEventListener('scroll', scheduleRender, { passive: true });
+        window.addEventListener('resize', scheduleRender);
+        setIndex(INDEX);
         var addRow = document.querySelector('.asset-row[data-asset-file]');
         if (addRow) {
             bindRow(addRow);
@@ -196,58 +381,866 @@ __ASSET_ROWS__
                 img.src = url;
             });
         }
+        if (window.__FAVICON_SERVE__ && window.EventSource) {
+            new EventSource('/events').addEventListener('assets', function () {
+                fetch('__INDEX_META__', { cache: 'no-store' }).then(function (r) { return r.json(); }).then(setIndex);
+            });
+        }
     </script>
 </body>
 </html>
 """
 
 
+class Stats:
+    # Per-stage wall time, counters and per-file timings; a no-op unless --stats/--profile is given
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.trace = False
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self.stages: dict[str, list] = {}
+        self.counters: dict[str, int] = {}
+        self.files: list[tuple[float, str]] = []  # min-heap of the STATS_TOP_FILES slowest
+        self.events: deque[dict] = deque(maxlen=TRACE_MAX_EVENTS)
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, start, time.perf_counter())
+
+    def add_time(self, name: str, start: float, end: float) -> None:
+        with self.lock:
+            entry = self.stages.setdefault(name, [0.0, 0])
+            entry[0] += end - start
+            entry[1] += 1
+            if self.trace:
+                # Chrome trace format; perf_counter is CLOCK_MONOTONIC, so worker timestamps line up
+                self.events.append(
+                    {"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "pid": os.getpid(), "tid": threading.get_ident()}
+                )
+
+    def count(self, key: str, n: int = 1) -> None:
+        if self.enabled:
+            with self.lock:
+                self.counters[key] = self.counters.get(key, 0) + n
+
+    def file_time(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            with self.lock:
+                self._keep_file(name, seconds)
+
+    def _keep_file(self, name: str, seconds: float) -> None:
+        if len(self.files) < STATS_TOP_FILES:
+            heapq.heappush(self.files, (seconds, name))
+        elif seconds > self.files[0][0]:
+            heapq.heapreplace(self.files, (seconds, name))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            files = [(name, secs) for secs, name in self.files]
+            return {"stages": self.stages, "counters": self.counters, "files": files, "events": list(self.events)}
+
+    def merge(self, snap: dict) -> None:
+        with self.lock:
+            for name, (secs, calls) in snap["stages"].items():
+                entry = self.stages.setdefault(name, [0.0, 0])
+                entry[0] += secs
+                entry[1] += calls
+            for key, n in snap["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + n
+            for name, secs in snap["files"]:
+                self._keep_file(name, secs)
+            self.events.extend(snap["events"])
+
+    def report(self) -> None:
+        snap = self.snapshot()
+        print(f"\n{'stage':<12} {'seconds':>9} {'calls':>7}")
+        for name, (secs, calls) in sorted(snap["stages"].items(), key=lambda kv: -kv[1][0]):
+            print(f"{name:<12} {secs:>9.3f} {calls:>7}")
+        for key, n in sorted(snap["counters"].items()):
+            if key.startswith("bytes_"):
+                value = f"{n / 1048576:.1f} MB" if n >= 1048576 else f"{n / 1024:.1f} KB"
+            else:
+                value = str(n)
+            print(f"{key:<12} {value:>17}")
+        slowest = sorted(snap["files"], key=lambda f: -f[1])
+        if slowest:
+            print("slowest files:")
+            for name, secs in slowest:
+                print(f"  {secs:>8.3f}s  {name}")
+
+    def write_trace(self, path: Path) -> None:
+        path.write_text(json.dumps({"traceEvents": self.snapshot()["events"]}), encoding="utf-8")
+
+
+STATS = Stats()
+
+
+class Histogram:
+    # Cumulative latency buckets per route, rendered in Prometheus text format
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series: dict[str, list] = {}
+
+    def observe(self, route: str, seconds: float) -> None:
+        with self.lock:
+            counts = self.series.setdefault(route, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[0][i] += 1
+            counts[1] += seconds
+            counts[2] += 1
+
+    def render(self, name: str) -> list[str]:
+        lines = [f"# TYPE {name} histogram"]
+        with self.lock:
+            for route, (counts, total, n) in sorted(self.series.items()):
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {c}')
+                lines.append(f'{name}_bucket{{route="{route}",le="+Inf"}} {n}')
+                lines.append(f'{name}_sum{{route="{route}"}} {total:.6f}')
+                lines.append(f'{name}_count{{route="{route}"}} {n}')
+        return lines
+
+
+def is_source(name: str) -> bool:
+    return name.rpartition(".")[2] in EXTS and not SKIP.search(name)
+
+
+class DirIndex:
+    # One os.scandir pass over the folder: source name -> (size, mtime_ns), plus every stem used by a
+    # file with one of EXTS. Outputs are named by stem only, so a stem taken by any extension is taken.
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.files: dict[str, tuple[int, int]] = {}
+        self.stems: set[str] = set()
+        self.outputs: list[str] = []
+        self._recorded: set[str] | None = None
+        self._next = 1
+        found = []
+        with STATS.stage("scan"), os.scandir(root) as it:
+            for entry in it:
+                stem, dot, ext = entry.name.rpartition(".")
+                if not dot or ext not in EXTS or entry.name.startswith(".") or not entry.is_file():
+                    continue
+                self.stems.add(stem)
+                found.append(entry)
+            # Outputs are told apart by their owner's stem, so classify once every stem is known
+            for entry in found:
+                if self.is_output(entry.name):
+                    self.outputs.append(entry.name)
+                elif not SKIP.search(entry.name):
+                    st = entry.stat()
+                    self.files[entry.name] = (st.st_size, st.st_mtime_ns)
+
+    def is_output(self, name: str) -> bool:
+        # favicon-x-NxN.png is an output when favicon-x.* is here or the manifest lists it as one. Never by
+        # name alone: a user's own favicon-brand-192x192.png is a source.
+        m = OUTPUT_RE.match(name)
+        if m is None:
+            return False
+        if m.group(1) in self.stems:
+            return True
+        if self._recorded is None:
+            self._recorded = {o for e in load_manifest().values() for o in e["outputs"]}
+        return name in self._recorded
+
+    def sources(self) -> list[Path]:
+        return [self.root / name for name in sorted(self.files)]
+
+    def allocate(self, ext: str) -> str:
+        # Lowest free favicon-test-NN; the cursor only moves forward because allocations only add stems.
+        # A long-lived index can miss files copied in since its scan, so the chosen stem is checked on disk.
+        while True:
+            stem = f"favicon-test-{self._next:02d}"
+            if stem not in self.stems:
+                self.stems.add(stem)
+                if not any((self.root / f"{stem}.{e}").exists() for e in EXTS):
+                    return f"{stem}.{ext}"
+            self._next += 1
+
+    def moved(self, old: str, new: str) -> None:
+        if old in self.files:
+            self.files[new] = self.files.pop(old)
+
+    def refresh(self, names: list[str] | set[str]) -> None:
+        # Re-stat just these names, for callers that keep one index across partial builds
+        present = []
+        for name in names:
+            self.files.pop(name, None)
+            try:
+                st = (self.root / name).stat()
+            except OSError:
+                continue
+            stem, dot, ext = name.rpartition(".")
+            if dot and ext in EXTS and not name.startswith(".") and stat.S_ISREG(st.st_mode):
+                self.stems.add(stem)
+                present.append((name, st))
+        for name, st in present:
+            if not self.is_output(name) and not SKIP.search(name):
+                self.files[name] = (st.st_size, st.st_mtime_ns)
+
+
 def collect_sources() -> list[Path]:
-    sources = []
-    for ext in EXTS:
-        for p in SCRIPT_DIR.glob("*." + ext):
-            if p.is_file() and not SKIP.search(p.name):
-                sources.append(p)
-    return sorted(set(sources))
-
-
-def rename_non_favicon(sources: list[Path]) -> None:
-    for p in list(sources):
-        if not p.name.startswith("favicon-"):
-            ext = p.suffix.lstrip(".")
-            n = 1
-            while (SCRIPT_DIR / f"favicon-test-{n:02d}.{ext}").exists():
-                n += 1
-            new_path = SCRIPT_DIR / f"favicon-test-{n:02d}.{ext}"
+    return DirIndex(SCRIPT_DIR).sources()
+
+
+def rename_non_favicon(sources: list[Path], index: DirIndex | None = None) -> list[Path]:
+    todo = [p for p in sources if not p.name.startswith("favicon-")]
+    if not todo:
+        return []
+    if index is None:
+        index = DirIndex(SCRIPT_DIR)
+    renamed = []
+    with STATS.stage("rename"):
+        for p in todo:
+            new_path = SCRIPT_DIR / index.allocate(p.suffix.lstrip("."))
             p.rename(new_path)
+            index.moved(p.name, new_path.name)
+            renamed.append(new_path)
+    return renamed
 
 
-def resize_pil(src: Path, w: int, h: int, out: Path) -> None:
+def resize_pil_multi(src: Path, targets: list[tuple[int, int, Path]]) -> None:
     if Image is None:
         raise SystemExit("Install Pillow: pip install Pillow")
+    largest = max(max(w, h) for w, h, _ in targets)
     with Image.open(src) as im:
-        im = im.convert("RGBA") if im.mode != "RGBA" else im
-        im.resize((w, h), Image.Resampling.NEAREST).save(out, "PNG")
+        with STATS.stage("decode"):
+            # JPEG can decode at 1/2..1/8 scale via DCT scaling; never below twice the largest target
+            if im.format == "JPEG":
+                im.draft("RGB", (largest * 2, largest * 2))
+            if im.width * im.height > MAX_PIXELS:
+                raise ValueError(f"{src.name}: {im.width}x{im.height} exceeds the {MAX_PIXELS} pixel budget")
+            im.load()
+            # Near the budget, shrink in the source mode before convert() so the RGBA copy is not full-size too.
+            # The box filter changes pixels, so ordinary uploads skip it and keep plain NEAREST output.
+            factor = min(im.width, im.height) // (largest * 2)
+            near_budget = im.width * im.height > MAX_PIXELS // 4
+            if near_budget and factor >= 2 and im.mode in ("L", "LA", "RGB", "RGBA", "I", "F"):
+                im = im.reduce(factor)
+                STATS.count("reduced")
+            im = im.convert("RGBA") if im.mode != "RGBA" else im
+        for w, h, out in targets:
+            with STATS.stage("resize"):
+                small = im.resize((w, h), Image.Resampling.NEAREST)
+            with STATS.stage("encode"):
+                small.save(out, "PNG")
+            STATS.count("bytes_written", out.stat().st_size if STATS.enabled else 0)
+    STATS.count("resize_pil")
+    STATS.count("bytes_read", src.stat().st_size if STATS.enabled else 0)
 
 
-def resize_cli(src: Path, w: int, h: int, out: Path) -> None:
-    for cmd in (["magick", str(src), "-resize", f"{w}x{h}", str(out)], ["convert", str(src), "-resize", f"{w}x{h}", str(out)]):
+def resize_cli_multi(src: Path, targets: list[tuple[int, int, Path]]) -> None:
+    # One process per source: decode once, then clone/resize/write for each size.
+    # Resource limits make ImageMagick spill oversized images to its disk cache instead of RAM.
+    largest = max(max(w, h) for w, h, _ in targets)
+    hints = ["-define", f"jpeg:size={largest * 2}x{largest * 2}"] if src.suffix.lower() in (".jpg", ".jpeg") else []
+    if src.suffix.lower() == ".svg":
+        hints = ["-background", "none", "-density", SVG_DENSITY]
+    ops: list[str] = []
+    for w, h, out in targets:
+        ops += ["(", "+clone", "-resize", f"{w}x{h}", "-write", str(out), "+delete", ")"]
+    for tool in ("magick", "convert"):
         try:
-            subprocess.run(cmd, check=True, capture_output=True, cwd=SCRIPT_DIR)
+            with STATS.stage("magick"):
+                cmd = [tool, *MAGICK_LIMITS, *hints, str(src), *ops, "null:"]
+                subprocess.run(cmd, check=True, capture_output=True, cwd=SCRIPT_DIR)
+            STATS.count("resize_cli")
             return
         except (FileNotFoundError, subprocess.CalledProcessError):
             continue
-    raise SystemExit("Need ImageMagick (magick) or Pillow (pip install Pillow)")
+    if Image is None:
+        raise SystemExit("Need ImageMagick (magick) or Pillow (pip install Pillow)")
+    raise SystemExit("ImageMagick (magick or convert) is not installed or could not read it")
+
+
+def resize_multi(src: Path, targets: list[tuple[int, int, Path]]) -> None:
+    if not targets:
+        return
+    try:
+        resize_pil_multi(src, targets)
+    except Exception as e:
+        try:
+            resize_cli_multi(src, targets)
+        except SystemExit as cli_error:
+            raise SystemExit(f"Pillow failed ({e}); {cli_error}")
+
+
+_SVG_RENDERER: bool | None = None
+
+
+def have_svg_renderer() -> bool:
+    # Looked up once per process, so folders of SVGs without a renderer do not spawn failing tools per file
+    global _SVG_RENDERER
+    if _SVG_RENDERER is None:
+        _SVG_RENDERER = cairosvg is not None or any(shutil.which(t) for t in ("rsvg-convert", "magick", "convert"))
+    return _SVG_RENDERER
+
+
+_MAGICK: bool | None = None
+
+
+def have_magick() -> bool:
+    global _MAGICK
+    if _MAGICK is None:
+        _MAGICK = any(shutil.which(t) for t in ("magick", "convert"))
+    return _MAGICK
+
+
+def render_env(svg: bool) -> str:
+    # What an as-is fallback depended on; the source is only tried again when this changes
+    if svg:
+        return "svg" if have_svg_renderer() else "no-svg-renderer"
+    return f"{'pil' if Image is not None else 'no-pil'}+{'magick' if have_magick() else 'no-magick'}:{MAX_PIXELS}"
+
+
+def rasterize_svg(src: Path, targets: list[tuple[int, int, Path]]) -> None:
+    # Each tier is rendered from the vector source, not downscaled from one bitmap
+    if not targets:
+        return
+    if not have_svg_renderer():
+        raise SystemExit("no SVG renderer found (pip install cairosvg, or install rsvg-convert or ImageMagick)")
+    if cairosvg is not None:
+        try:
+            with STATS.stage("rasterize"):
+                for w, h, out in targets:
+                    cairosvg.svg2png(url=str(src), write_to=str(out), output_width=w, output_height=h)
+            STATS.count("rasterize_cairosvg")
+            return
+        except Exception:
+            pass
+    try:
+        with STATS.stage("rasterize"):
+            for w, h, out in targets:
+                cmd = ["rsvg-convert", "-w", str(w), "-h", str(h), "-o", str(out), str(src)]
+                subprocess.run(cmd, check=True, capture_output=True, cwd=SCRIPT_DIR)
+        STATS.count("rasterize_rsvg")
+        return
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        pass
+    try:
+        resize_cli_multi(src, targets)
+    except SystemExit:
+        raise SystemExit("no SVG renderer worked (pip install cairosvg, or install rsvg-convert or ImageMagick)")
+
+
+def resize_pil(src: Path, w: int, h: int, out: Path) -> None:
+    resize_pil_multi(src, [(w, h, out)])
+
+
+def resize_cli(src: Path, w: int, h: int, out: Path) -> None:
+    resize_cli_multi(src, [(w, h, out)])
 
 
 def resize(src: Path, w: int, h: int, out: Path) -> None:
+    resize_multi(src, [(w, h, out)])
+
+
+def optimize_png(path: Path) -> tuple[int, int]:
+    # Lossless only: an exact palette when there are <= 256 RGBA colors, RGB when fully opaque,
+    # no metadata chunks and maximum deflate. The file is replaced only if a candidate is smaller.
+    data = path.read_bytes()
+    with STATS.stage("optimize"):
+        with Image.open(io.BytesIO(data)) as im:
+            im = im.convert("RGBA")
+        raw = im.tobytes()
+        candidates = [(im, {})]
+        if im.getextrema()[3][0] == 255:
+            candidates.append((im.convert("RGB"), {}))
+        colors = im.getcolors(256)
+        if colors is not None:
+            # Translucent entries first, so the tRNS chunk stops at the last one
+            palette = sorted((c for _, c in colors), key=lambda c: c[3] == 255)
+            index = {bytes(c): i for i, c in enumerate(palette)}
+            pal = Image.frombytes("P", im.size, bytes(index[raw[i:i + 4]] for i in range(0, len(raw), 4)))
+            pal.putpalette(b"".join(bytes(c[:3]) for c in palette), "RGB")
+            opts = {"bits": next(b for b in (1, 2, 4, 8) if len(palette) <= 1 << b)}
+            alphas = bytes(c[3] for c in palette if c[3] != 255)
+            if alphas:
+                opts["transparency"] = alphas
+            candidates.append((pal, opts))
+        best = data
+        for candidate, opts in candidates:
+            buf = io.BytesIO()
+            candidate.save(buf, "PNG", optimize=True, **opts)
+            if buf.tell() >= len(best):
+                continue
+            with Image.open(io.BytesIO(buf.getvalue())) as check:
+                if check.convert("RGBA").tobytes() == raw:
+                    best = buf.getvalue()
+        if best is not data:
+            path.write_bytes(best)
+    STATS.count("bytes_saved", len(data) - len(best))
+    return len(data), len(best)
+
+
+def perceptual_hash(path: Path) -> str | None:
+    # 64-bit difference hash (brightness steps on a 9x8 grid) plus the mean RGB, from the 32px output.
+    # Format, resolution and recompression barely move either, so copies of one logo land within DEDUP_DISTANCE.
+    if Image is None:
+        return None
+    with STATS.stage("phash"):
+        try:
+            with Image.open(path) as im:
+                im = im.convert("RGBA")
+        except OSError:
+            return None
+        flat = Image.new("RGBA", im.size, (255, 255, 255, 255))
+        flat.alpha_composite(im)
+        flat = flat.convert("RGB")
+        grid = flat.convert("L").resize((9, 8), Image.Resampling.BOX).tobytes()
+        bits = 0
+        for y in range(8):
+            for x in range(8):
+                bits = bits << 1 | (grid[y * 9 + x] < grid[y * 9 + x + 1])
+        mean = flat.resize((1, 1), Image.Resampling.BOX).tobytes()
+    return f"{bits:016x}{mean.hex()}"
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with STATS.stage("hash"), open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+            STATS.count("bytes_read", len(chunk))
+    return h.hexdigest()
+
+
+def write_precompressed(path: Path, data: bytes) -> None:
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, 9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data))
+
+
+def load_manifest() -> dict[str, dict]:
+    try:
+        data = json.loads((SCRIPT_DIR / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    entries = data.get("entries", {}) if data.get("version") == 1 else {}
+    try:
+        with open(SCRIPT_DIR / MANIFEST_LOG, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    name, entry = json.loads(line)
+                except ValueError:
+                    break  # torn last line from an interrupted append
+                entries[name] = entry
+    except OSError:
+        pass
+    return entries
+
+
+def save_manifest(entries: dict[str, dict]) -> None:
+    # Keep entries whose outputs still exist so a renamed source can reuse them later
+    live = {
+        name: e
+        for name, e in entries.items()
+        if (SCRIPT_DIR / name).is_file() or any((SCRIPT_DIR / o).is_file() for o in e["outputs"])
+    }
+    (SCRIPT_DIR / MANIFEST).write_text(json.dumps({"version": 1, "entries": live}, indent=1, sort_keys=True), encoding="utf-8")
+    (SCRIPT_DIR / MANIFEST_LOG).unlink(missing_ok=True)
+
+
+def manifest_stamp() -> tuple[tuple[int, int] | None, ...]:
+    # (size, mtime_ns) of MANIFEST and MANIFEST_LOG, so a long-lived process can tell when another one wrote them
+    stamp = []
+    for name in (MANIFEST, MANIFEST_LOG):
+        try:
+            st = (SCRIPT_DIR / name).stat()
+        except OSError:
+            stamp.append(None)
+        else:
+            stamp.append((st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+
+def append_manifest(entries: dict[str, dict], names: list[str]) -> None:
+    # O(changed) persistence for partial builds; compacts into MANIFEST once the log outgrows MANIFEST_LOG_MAX
+    if not names:
+        return
+    with open(SCRIPT_DIR / MANIFEST_LOG, "a", encoding="utf-8") as f:
+        for name in names:
+            f.write(json.dumps([name, entries[name]], sort_keys=True) + "\n")
+        size = f.tell()
+    if size > MANIFEST_LOG_MAX:
+        save_manifest(entries)
+
+
+_MANIFEST: dict[str, dict] = {}
+_BY_HASH: dict[tuple[str, str], str] = {}
+
+
+def _init_worker(
+    entries: dict[str, dict], stats: bool = False, max_pixels: int = MAX_PIXELS, optimize: bool = False, root: Path | None = None
+) -> None:
+    # Also the pool initializer, so each worker receives the manifest and settings once rather than per task
+    global _MANIFEST, _BY_HASH, MAX_PIXELS, OPTIMIZE, SCRIPT_DIR
+    if root is not None:
+        SCRIPT_DIR = root
+    _MANIFEST = entries
+    _BY_HASH = {(e["hash"], e["params"]): name for name, e in entries.items()}
+    STATS.enabled = stats
+    MAX_PIXELS = max_pixels
+    OPTIMIZE = optimize
+
+
+def _apply_delta(delta: dict[str, dict]) -> None:
+    # Entries changed since a long-lived pool started; its workers only received the manifest at start-up
+    for name, entry in delta.items():
+        if _MANIFEST.get(name) != entry:
+            _MANIFEST[name] = entry
+            _BY_HASH[(entry["hash"], entry["params"])] = name
+
+
+def worker_pixels(max_pixels: int, jobs: int) -> int:
+    # --max-pixels bounds decoding across all workers. Only JPEG decodes at reduced scale (draft); PNG and
+    # WebP frames are decoded full-size, so each of N workers gets a 1/N share of the budget.
+    workers = jobs if jobs > 0 else os.cpu_count() or 1
+    return max(1, max_pixels // workers)
+
+
+def _build_task(
+    src: Path,
+    check: bool,
+    force: bool,
+    sizes: tuple[int, ...],
+    known: tuple[int, int] | None = None,
+    delta: dict[str, dict] | None = None,
+) -> tuple[tuple[list[str], dict], dict | None]:
+    # Runs build_one against a fresh Stats so worker measurements travel back with the result
+    global STATS
+    if delta:
+        _apply_delta(delta)
+    if not STATS.enabled:
+        return build_one(src, check, force, sizes, known), None
+    outer, STATS = STATS, Stats(enabled=True)
+    STATS.trace = outer.trace
+    started = time.perf_counter()
     try:
-        resize_pil(src, w, h, out)
-    except Exception:
-        resize_cli(src, w, h, out)
+        result = build_one(src, check, force, sizes, known)
+    finally:
+        STATS.file_time(src.name, time.perf_counter() - started)
+        local, STATS = STATS, outer
+    return result, local.snapshot()
+
+
+def reuse_outputs(digest: str, params: str, targets: list[tuple[int, int, Path]]) -> bool:
+    donor = _BY_HASH.get((digest, params))
+    entry = _MANIFEST.get(donor) if donor is not None else None
+    # The index is only ever added to, so check the donor still holds these bytes and params
+    if entry is None or entry["hash"] != digest or entry["params"] != params:
+        return False
+    donor_base = Path(donor).stem
+    pairs = [(SCRIPT_DIR / output_name(donor_base, w), out) for w, _, out in targets]
+    if not all(d.is_file() for d, _ in pairs):
+        return False
+    for d, out in pairs:
+        if d != out:
+            shutil.copyfile(d, out)
+    return True
+
+
+def build_one(
+    src: Path, check: bool, force: bool, sizes: tuple[int, ...] = SIZES, known: tuple[int, int] | None = None
+) -> tuple[list[str], dict]:
+    # known is (size, mtime_ns) from a DirIndex scan, which saves a second stat per source
+    base = src.stem
+    if known is None:
+        st = src.stat()
+        known = (st.st_size, st.st_mtime_ns)
+    size, mtime_ns = known
+    prev = _MANIFEST.get(src.name)
+    if prev and prev["size"] == size and prev["mtime_ns"] == mtime_ns:
+        digest = prev["hash"]
+    else:
+        digest = file_hash(src)
+    if src.suffix.lower() == ".svg":
+        if force or prev is None or prev["hash"] != digest or not src.with_name(src.name + ".gz").exists():
+            write_precompressed(src, src.read_bytes())
+        params, render = SVG_PARAMS, rasterize_svg
+    else:
+        params, render = RESIZE_PARAMS, resize_multi
+    if OPTIMIZE:
+        params = f"{params}+{OPTIMIZE_PARAMS}"
+    env = render_env(render is rasterize_svg)
+    if not force and prev and prev["params"] == AS_IS_PARAMS and prev["hash"] == digest:
+        # Already failed with these bytes, params and tools: keep showing it as-is without decoding again
+        if prev.get("tried") == params and prev.get("env") == env:
+            return [], {**prev, "size": size, "mtime_ns": mtime_ns}
+    targets = [(n, n, SCRIPT_DIR / output_name(base, n)) for n in sizes]
+    fresh = prev is not None and prev["hash"] == digest and prev["params"] == params
+    # A recorded hash that no longer matches means the outputs belong to an older file of this name
+    stale = not fresh and (check or prev is not None)
+    if not (force or stale):
+        targets = [t for t in targets if not t[2].exists()]
+    lines = [f"  {out.name}" for _, _, out in targets]
+    if targets and not force and reuse_outputs(digest, params, targets):
+        lines = [line + " (cached)" for line in lines]
+    else:
+        try:
+            render(src, targets)
+        except SystemExit as e:
+            # One unreadable or oversized source must not stop the batch; its row shows the file itself
+            entry = {"hash": digest, "size": size, "mtime_ns": mtime_ns, "params": AS_IS_PARAMS, "outputs": [], "tried": params, "env": env}
+            return [f"  ({src.name}: shown as-is, {e})"], entry
+        if OPTIMIZE and targets:
+            before = after = 0
+            for i, (_, _, out) in enumerate(targets):
+                b, a = optimize_png(out)
+                before, after = before + b, after + a
+                lines[i] += f" ({b} -> {a} bytes)"
+            lines.append(f"  {src.name}: saved {before - after} bytes ({100 * (before - after) // max(before, 1)}%)")
+    entry = {
+        "hash": digest,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "params": params,
+        "outputs": [output_name(base, n) for n in sizes],
+    }
+    # dedup_sources computes perceptual hashes on demand; keep one while its outputs are untouched
+    if prev and not targets and prev["hash"] == digest and prev.get("phash"):
+        entry["phash"] = prev["phash"]
+    return lines, entry
+
+
+def build_all(
+    sources: list[Path],
+    check: bool,
+    force: bool,
+    jobs: int = 1,
+    sizes: tuple[int, ...] = SIZES,
+    entries: dict[str, dict] | None = None,
+    known: dict[str, tuple[int, int]] | None = None,
+    pool: ProcessPoolExecutor | None = None,
+    delta: dict[str, dict] | None = None,
+) -> dict[str, dict]:
+    # pool.map yields in source order, so console output is the same for any --jobs.
+    # Callers that keep the manifest in memory pass it as entries; it is updated in place and they persist
+    # it themselves. A long-lived pool comes with the entries changed since it started, as delta.
+    if not sources:
+        return {} if entries is None else entries
+    save = entries is None
+    if save:
+        entries = load_manifest()
+    if _MANIFEST is not entries:
+        _init_worker(entries, STATS.enabled, MAX_PIXELS, OPTIMIZE)
+    n = len(sources)
+    stamps = [known.get(s.name) for s in sources] if known else [None] * n
+    own = None
+    if jobs == 1 or n < 2:
+        results = map(_build_task, sources, [check] * n, [force] * n, [sizes] * n, stamps)
+    else:
+        if pool is None:
+            pool = own = ProcessPoolExecutor(
+                max_workers=jobs if jobs > 0 else None,
+                initializer=_init_worker,
+                initargs=(entries, STATS.enabled, worker_pixels(MAX_PIXELS, jobs), OPTIMIZE, SCRIPT_DIR),
+            )
+        results = pool.map(_build_task, sources, [check] * n, [force] * n, [sizes] * n, stamps, [delta] * n, chunksize=max(1, n // 64))
+    try:
+        for src, ((lines, entry), snap) in zip(sources, results):
+            for line in lines:
+                print(line)
+            entries[src.name] = entry
+            _BY_HASH[(entry["hash"], entry["params"])] = src.name
+            if snap is not None:
+                STATS.merge(snap)
+    finally:
+        if own is not None:
+            own.shutdown()
+    if save:
+        save_manifest(entries)
+    return entries
+
+
+def asset_version(entries: dict[str, dict], name: str) -> str:
+    # ?v= URLs are served immutable, so the version covers the pipeline (params) as well as the source bytes
+    entry = entries.get(name)
+    if not entry:
+        return ""
+    return hashlib.blake2b(f"{entry['hash']}:{entry['params']}".encode(), digest_size=6).hexdigest()
+
+
+def is_shown_as_is(entries: dict[str, dict], name: str) -> bool:
+    # A source that could not be rendered has no PNG tiers; its row shows the file itself
+    return entries.get(name, {}).get("params") == AS_IS_PARAMS
+
+
+def pack_ico(pngs: list[tuple[int, bytes]]) -> bytes:
+    # PNG-compressed ICO entries, which every current browser and Windows Vista+ read; 0 means 256px
+    offset = 6 + 16 * len(pngs)
+    head = [struct.pack("<HHH", 0, 1, len(pngs))]
+    for size, data in pngs:
+        head.append(struct.pack("<BBBBHHII", size % 256, size % 256, 0, 0, 1, 32, len(data), offset))
+        offset += len(data)
+    return b"".join(head) + b"".join(data for _, data in pngs)
+
+
+def bundle_snippet(svg: bool) -> str:
+    links = [
+        '<link rel="icon" href="/favicon.ico" sizes="48x48">',
+        '<link rel="icon" type="image/png" sizes="32x32" href="/favicon-32x32.png">',
+        '<link rel="icon" type="image/png" sizes="16x16" href="/favicon-16x16.png">',
+        '<link rel="apple-touch-icon" sizes="180x180" href="/apple-touch-icon.png">',
+        '<link rel="manifest" href="/site.webmanifest">',
+    ]
+    if svg:
+        links.insert(1, '<link rel="icon" type="image/svg+xml" href="/icon.svg">')
+    return "\n".join(links) + "\n"
+
+
+def build_bundle(src: Path, digest: str, force: bool) -> list[str]:
+    # All sizes come from one decode (resize_multi / rasterize_svg), then the small ones are packed into the .ico
+    out_dir = SCRIPT_DIR / BUNDLE_DIR / src.stem
+    stamp = out_dir / "bundle.json"
+    key = {"source": src.name, "hash": digest, "params": f"{BUNDLE_PARAMS}+{OPTIMIZE_PARAMS}" if OPTIMIZE else BUNDLE_PARAMS}
+    label = f"  {BUNDLE_DIR}/{src.stem}/"
+    try:
+        if not force and json.loads(stamp.read_text(encoding="utf-8")) == key:
+            return [label + " (unchanged)"]
+    except (OSError, ValueError):
+        pass
+    svg = src.suffix.lower() == ".svg"
+    # Render into a hidden scratch folder, so a failed render leaves no empty bundle directory behind
+    with tempfile.TemporaryDirectory(prefix=".favicon-bundle-", dir=SCRIPT_DIR) as tmp:
+        work = Path(tmp)
+        targets = {n: work / f"favicon-{n}x{n}.png" for n in BUNDLE_ICO_SIZES}
+        targets.update({n: work / name for name, n in BUNDLE_PNGS.items()})
+        try:
+            (rasterize_svg if svg else resize_multi)(src, [(n, n, out) for n, out in sorted(targets.items())])
+        except SystemExit as e:
+            return [f"  (bundle skipped for {src.name}: {e})"]
+        if OPTIMIZE:
+            for out in targets.values():
+                optimize_png(out)
+        ico = [(n, targets[n].read_bytes()) for n in BUNDLE_ICO_SIZES]
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name in BUNDLE_PNGS:
+            os.replace(work / name, out_dir / name)
+    (out_dir / "favicon.ico").write_bytes(pack_ico(ico))
+    if svg:
+        shutil.copyfile(src, out_dir / "icon.svg")
+    manifest = {
+        "name": src.stem,
+        "short_name": src.stem,
+        "icons": [
+            {"src": f"/android-chrome-{n}x{n}.png", "sizes": f"{n}x{n}", "type": "image/png"} for n in (192, 512)
+        ],
+        "theme_color": "#ffffff",
+        "background_color": "#ffffff",
+        "display": "standalone",
+    }
+    (out_dir / "site.webmanifest").write_text(json.dumps(manifest, indent=1) + "\n", encoding="utf-8")
+    (out_dir / "head.html").write_text(bundle_snippet(svg), encoding="utf-8")
+    stamp.write_text(json.dumps(key), encoding="utf-8")
+    return [label]
+
+
+def build_bundles(sources: list[Path], entries: dict[str, dict], force: bool, jobs: int = 1) -> None:
+    sources = [s for s in sources if s.name in entries]
+    digests = [entries[s.name]["hash"] for s in sources]
+    n = len(sources)
+    if jobs == 1 or n < 2:
+        results = map(build_bundle, sources, digests, [force] * n)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=jobs if jobs > 0 else None,
+            initializer=_init_worker,
+            initargs=({}, False, worker_pixels(MAX_PIXELS, jobs), OPTIMIZE, SCRIPT_DIR),
+        )
+        results = pool.map(build_bundle, sources, digests, [force] * n, chunksize=max(1, n // 64))
+    try:
+        for lines in results:
+            for line in lines:
+                print(line)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
 
+def find_duplicates(hashes: dict[str, str]) -> list[list[str]]:
+    # Union-find over near-identical perceptual hashes. Two 64-bit hashes within DEDUP_DISTANCE bits agree
+    # exactly on at least one of DEDUP_DISTANCE + 1 bands (pigeonhole), so only names sharing a band are compared.
+    by_hash: dict[str, list[str]] = {}
+    for name in sorted(hashes):
+        by_hash.setdefault(hashes[name], []).append(name)
+    parent = {h: h for h in by_hash}
 
-def do_delete(filename: str) -> None:
+    def root(h: str) -> str:
+        while parent[h] != h:
+            parent[h] = parent[parent[h]]
+            h = parent[h]
+        return h
+
+    bands = [64 * i // (DEDUP_DISTANCE + 1) for i in range(DEDUP_DISTANCE + 2)]
+    buckets: dict[tuple[int, int], list[str]] = {}
+    for h in sorted(by_hash):
+        bits, color = int(h[:16], 16), bytes.fromhex(h[16:])
+        for i in range(DEDUP_DISTANCE + 1):
+            key = (i, bits >> bands[i] & ((1 << (bands[i + 1] - bands[i])) - 1))
+            for other in buckets.get(key, ()):
+                if root(h) == root(other) or (bits ^ int(other[:16], 16)).bit_count() > DEDUP_DISTANCE:
+                    continue
+                if max(abs(a - b) for a, b in zip(color, bytes.fromhex(other[16:]))) <= DEDUP_COLOR:
+                    parent[root(h)] = root(other)
+            buckets.setdefault(key, []).append(h)
+    groups: dict[str, list[str]] = {}
+    for h, names in by_hash.items():
+        groups.setdefault(root(h), []).extend(names)
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+
+def ensure_phashes(sources: list[Path], entries: dict[str, dict]) -> list[str]:
+    # Perceptual hashes are only needed for dedup, so they are computed here rather than in build_one.
+    # Returns the names whose entries changed, for the caller to persist.
+    missing = [s.name for s in sources if entries.get(s.name, {}).get("outputs") and not entries[s.name].get("phash")]
+    for name in missing:
+        phash = perceptual_hash(SCRIPT_DIR / output_name(Path(name).stem, 32))
+        if phash:
+            entries[name]["phash"] = phash
+    return missing
+
+
+def dedup_sources(
+    sources: list[Path], entries: dict[str, dict], prune: bool = False, announce: set[str] | None = None
+) -> tuple[list[Path], dict[str, list[str]]]:
+    # One source per group of near-identical icons is kept: an SVG if there is one, else the largest file.
+    # The rest are listed behind its row, or deleted with prune. Returns (kept sources, kept -> hidden names).
+    # Run ensure_phashes first; sources without a perceptual hash are never grouped. With announce, only
+    # groups that include one of those names are printed.
+    hashes = {s.name: entries[s.name]["phash"] for s in sources if entries.get(s.name, {}).get("phash")}
+    hidden: set[str] = set()
+    dupes: dict[str, list[str]] = {}
+    with STATS.stage("dedup"):
+        for group in find_duplicates(hashes):
+            group.sort(key=lambda n: (not n.lower().endswith(".svg"), -entries[n]["size"], n))
+            keep, rest = group[0], group[1:]
+            quiet = announce is not None and announce.isdisjoint(group)
+            for name in rest:
+                if prune:
+                    do_delete(name, announce=False)
+                if not quiet:
+                    print(f"  {'pruned' if prune else 'grouped'} {name} (same icon as {keep})")
+            if not prune:
+                dupes[keep] = rest
+            hidden.update(rest)
+    return [s for s in sources if s.name not in hidden], dupes
+
+
+def do_delete(filename: str, announce: bool = True) -> None:
     path = SCRIPT_DIR / filename
     if not path.is_file():
         return
@@ -255,80 +1248,51 @@ def do_delete(filename: str) -> None:
         raise SystemExit("Invalid filename")
     path.unlink()
     base = path.stem
-    for suffix in ("-16x16.png", "-32x32.png"):
-        p = SCRIPT_DIR / f"{base}{suffix}"
+    own = re.compile(re.escape(base) + r"-(\d+)x\1\.png")
+    outputs = [p for p in SCRIPT_DIR.glob(f"{glob.escape(base)}-*x*.png") if own.fullmatch(p.name)]
+    for p in outputs + [SCRIPT_DIR / f"{path.name}.gz", SCRIPT_DIR / f"{path.name}.br"]:
         if p.is_file():
             p.unlink()
-    print(f"Deleted {filename}. Regenerating...")
+    shutil.rmtree(SCRIPT_DIR / BUNDLE_DIR / base, ignore_errors=True)
+    if announce:
+        print(f"Deleted {filename}. Regenerating...")
 
 
 def do_clean_all() -> None:
-    for ext in ("png", "jpg", "jpeg", "webp", "svg"):
+    for ext in ("png", "jpg", "jpeg", "webp", "svg", "svg.gz", "svg.br", "html.gz", "html.br"):
         for p in SCRIPT_DIR.glob("favicon-*." + ext):
             if p.is_file():
                 p.unlink()
                 print(f"  removed {p.name}")
-    for p in list(SCRIPT_DIR.glob("*-16x16.png")) + list(SCRIPT_DIR.glob("*-32x32.png")):
-        if p.is_file():
-            p.unlink()
-            print(f"  removed {p.name}")
+    for p in generated_outputs():
+        p.unlink()
+        print(f"  removed {p.name}")
     (SCRIPT_DIR / OUT_HTML).unlink(missing_ok=True)
+    (SCRIPT_DIR / MANIFEST).unlink(missing_ok=True)
+    (SCRIPT_DIR / MANIFEST_LOG).unlink(missing_ok=True)
+    (SCRIPT_DIR / ATLAS_MAP).unlink(missing_ok=True)
+    shutil.rmtree(SCRIPT_DIR / BUNDLE_DIR, ignore_errors=True)
+    for p in SCRIPT_DIR.glob("favicon-tester-index*.json"):
+        p.unlink()
     print("Done. Add images and run again.")
 
 
+def generated_outputs() -> list[Path]:
+    return [SCRIPT_DIR / name for name in sorted(DirIndex(SCRIPT_DIR).outputs)]
+
+
 def do_clean() -> None:
-    for p in list(SCRIPT_DIR.glob("*-16x16.png")) + list(SCRIPT_DIR.glob("*-32x32.png")):
-        if p.is_file():
-            p.unlink()
-            print(f"  removed {p.name}")
+    atlas = [SCRIPT_DIR / ATLAS_MAP] + [SCRIPT_DIR / f"favicon-atlas-{n}.png" for n in ATLAS_SIZES]
+    for p in generated_outputs() + [p for p in atlas if p.is_file()]:
+        p.unlink()
+        print(f"  removed {p.name}")
+    if (SCRIPT_DIR / BUNDLE_DIR).is_dir():
+        shutil.rmtree(SCRIPT_DIR / BUNDLE_DIR)
+        print(f"  removed {BUNDLE_DIR}/")
     print("Done. Run script to regenerate.")
 
 
-def generate(check: bool, force: bool, inject_serve: bool = False) -> int:
-    os.chdir(SCRIPT_DIR)
-    sources = collect_sources()
-    rename_non_favicon(sources)
-    sources = collect_sources()
-    base_names: list[str] = []
-    for src in sources:
-        base = src.stem
-        base_names.append(base)
-        if src.suffix.lower() == ".svg":
-            print(f"  (SVG: {src.name} — no resize)")
-            continue
-        out16 = SCRIPT_DIR / f"{base}-16x16.png"
-        out32 = SCRIPT_DIR / f"{base}-32x32.png"
-        need16 = force or not out16.exists() or (check and src.stat().st_mtime > out16.stat().st_mtime)
-        need32 = force or not out32.exists() or (check and src.stat().st_mtime > out32.stat().st_mtime)
-        if need16:
-            resize(src, 16, 16, out16)
-            print(f"  {out16.name}")
-        if need32:
-            resize(src, 32, 32, out32)
-            print(f"  {out32.name}")
-
-    # First icon links
-    first_16 = first_32 = "favicon.ico"
-    first_links = '    <link rel="icon" href="favicon.ico">'
-    if base_names:
-        first_base = base_names[0]
-        first_src = None
-        for ext in EXTS:
-            p = SCRIPT_DIR / f"{first_base}.{ext}"
-            if p.exists():
-                first_src = p.name
-                break
-        if first_src:
-            if first_src.endswith(".svg"):
-                first_16 = first_32 = first_src
-                first_links = f'    <link rel="icon" type="image/svg+xml" href="{first_src}">'
-            else:
-                first_16 = f"{first_base}-16x16.png"
-                first_32 = f"{first_base}-32x32.png"
-                first_links = f'    <link rel="icon" type="image/png" sizes="32x32" href="{first_32}">\n    <link rel="icon" type="image/png" sizes="16x16" href="{first_16}">'
-
-    # Build asset rows
-    add_row = """
+ADD_ROW = """
             <div class="asset-row" data-asset-file>
                 <span class="asset-name">Add another (choose file)</span>
                 <input type="file" accept="image/*" class="third-file" style="font-size: 0.75rem;">
@@ -344,74 +1308,775 @@ def generate(check: bool, force: bool, inject_serve: bool = False) -> int:
                     <button type="button" class="dl dl-32" disabled>Download 32×32</button>
                 </div>
             </div>"""
-    rows = []
-    for base in base_names:
-        src_name = None
-        for ext in EXTS:
-            p = SCRIPT_DIR / f"{base}.{ext}"
-            if p.exists():
-                src_name = p.name
-                break
-        if not src_name:
-            continue
-        if src_name.endswith(".svg"):
-            rows.append(f'''
-            <div class="asset-row" data-asset-src="{src_name}" data-svg="true">
-                <span class="asset-name">{src_name}</span>
-                <div class="sizes">
-                    <div class="size-cell"><span class="label">16</span><img src="{src_name}" alt="" width="16" height="16"></div>
-                    <div class="size-cell"><span class="label">32</span><img src="{src_name}" alt="" width="32" height="32"></div>
-                    <div class="size-cell"><span class="label">48</span><img src="{src_name}" alt="" width="48" height="48"></div>
-                    <div class="size-cell"><span class="label">64</span><img src="{src_name}" alt="" width="64" height="64"></div>
-                </div>
-                <div class="actions">
-                    <button type="button" class="use-tab use-tab-svg">Use as tab</button>
-                    <button type="button" class="btn-delete" data-filename="{src_name}">Delete</button>
-                    <a href="{src_name}" download class="dl-svg">Download SVG</a>
-                </div>
-            </div>''')
+
+
+def output_name(base: str, size: int) -> str:
+    return f"{base}-{size}x{size}.png"
+
+
+def render_first_icon(first_src: str | None, version: str = "", as_is: bool = False) -> tuple[str, str, str]:
+    if not first_src:
+        return '    <link rel="icon" href="favicon.ico">', "favicon.ico", "favicon.ico"
+    v = f"?v={version}" if version else ""
+    if as_is:
+        kind = {"svg": "image/svg+xml", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}.get(
+            first_src.rpartition(".")[2], "image/png"
+        )
+        return f'    <link rel="icon" type="{kind}" href="{first_src}{v}">', f"{first_src}{v}", f"{first_src}{v}"
+    first_base = Path(first_src).stem
+    first_16 = f"{output_name(first_base, 16)}{v}"
+    first_32 = f"{output_name(first_base, 32)}{v}"
+    links = f'    <link rel="icon" type="image/png" sizes="32x32" href="{first_32}">\n    <link rel="icon" type="image/png" sizes="16x16" href="{first_16}">'
+    return links, first_16, first_32
+
+
+def build_atlas(versions: dict[str, str], as_is: set[str] | frozenset[str] = frozenset()) -> dict | None:
+    if Image is None:
+        print("  (atlas skipped: needs Pillow)")
+        return None
+    try:
+        prev = json.loads((SCRIPT_DIR / ATLAS_MAP).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        prev = {}
+    if prev.get("columns") != ATLAS_COLUMNS:
+        prev = {}
+    rasters = sorted(n for n in versions if n not in as_is)
+    # Slots are sticky: existing assets keep their cell, new ones take the lowest free slot
+    slots = {n: s for n, s in prev.get("slots", {}).items() if n in versions and n not in as_is}
+    taken = set(slots.values())
+    free = (i for i in range(len(rasters) + len(taken)) if i not in taken)
+    for name in rasters:
+        if name not in slots:
+            slots[name] = next(free)
+    capacity = max(slots.values(), default=-1) + 1
+    prev_versions = prev.get("versions", {})
+    dirty = {s for n, s in slots.items() if prev_versions.get(n) != versions[n] or prev.get("slots", {}).get(n) != s}
+    dirty |= {s for n, s in prev.get("slots", {}).items() if slots.get(n) != s}
+    sheets = {}
+    for size in ATLAS_SIZES:
+        path = SCRIPT_DIR / f"favicon-atlas-{size}.png"
+        width, height = ATLAS_COLUMNS * size, max(1, -(-capacity // ATLAS_COLUMNS)) * size
+        sheet = Image.new("RGBA", (width, height))
+        redraw = set(dirty)
+        try:
+            with Image.open(path) as old:
+                sheet.paste(old.crop((0, 0, width, height)))
+        except (OSError, ValueError):
+            redraw = set(slots.values())
+        by_slot = {s: n for n, s in slots.items()}
+        for slot in redraw:
+            x, y = slot % ATLAS_COLUMNS * size, slot // ATLAS_COLUMNS * size
+            sheet.paste((0, 0, 0, 0), (x, y, x + size, y + size))
+            name = by_slot.get(slot)
+            if name is None:
+                continue
+            try:
+                with Image.open(SCRIPT_DIR / output_name(Path(name).stem, size)) as icon:
+                    icon = icon.convert("RGBA")
+                    sheet.paste(icon.resize((size, size), Image.Resampling.NEAREST) if icon.size != (size, size) else icon, (x, y))
+            except OSError:
+                pass
+        if redraw or not path.exists() or prev.get("capacity") != capacity:
+            sheet.save(path, "PNG")
+        sheets[str(size)] = f"{path.name}?v={file_hash(path)[:12]}"
+    atlas = {"columns": ATLAS_COLUMNS, "capacity": capacity, "sheets": sheets, "slots": slots, "versions": {n: versions[n] for n in slots}}
+    write_if_changed(SCRIPT_DIR / ATLAS_MAP, json.dumps(atlas, indent=1, sort_keys=True).encode())
+    return atlas
+
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    with STATS.stage("write"):
+        try:
+            if path.read_bytes() == data:
+                return False
+        except OSError:
+            pass
+        path.write_bytes(data)
+        STATS.count("bytes_written", len(data))
+    return True
+
+
+def index_page_name(n: int) -> str:
+    return f"favicon-tester-index-{n:04d}.json"
+
+
+class Page:
+    # Asset index keyed by source name -> content version. The browser renders rows from it
+    # lazily; the served page fetches it in INDEX_PAGE_SIZE shards, the static one has it inline.
+    def __init__(self, sizes: tuple[int, ...] = SIZES, atlas: bool = False) -> None:
+        self.rows: dict[str, str] = {}
+        self.as_is: set[str] = set()
+        self.dupes: dict[str, list[str]] = {}
+        self.sizes = sizes
+        self.use_atlas = atlas
+        self.atlas: dict | None = None
+        # (assets slice, path, url) per shard as last written, so a partial update rewrites only its shards
+        self._shards: list[tuple[list[list], Path, str]] | None = None
+
+    def configure(self, sizes: tuple[int, ...], atlas: bool = False) -> None:
+        self.sizes = sizes
+        self.use_atlas = atlas
+
+    def add(self, src_name: str, version: str = "", as_is: bool = False) -> None:
+        self.rows[src_name] = version
+        if as_is:
+            self.as_is.add(src_name)
         else:
-            out16 = f"{base}-16x16.png"
-            out32 = f"{base}-32x32.png"
-            rows.append(f'''
-            <div class="asset-row" data-asset-src="{src_name}">
-                <span class="asset-name">{src_name}</span>
-                <div class="sizes">
-                    <div class="size-cell"><span class="label">16</span><img src="{out16}" alt="" width="16" height="16"></div>
-                    <div class="size-cell"><span class="label">32</span><img src="{out32}" alt="" width="32" height="32"></div>
-                    <div class="size-cell"><span class="label">48</span><img src="{out32}" alt="" width="48" height="48"></div>
-                    <div class="size-cell"><span class="label">64</span><img src="{src_name}" alt="" width="64" height="64"></div>
-                </div>
-                <div class="actions">
-                    <button type="button" class="use-tab">Use as tab</button>
-                    <button type="button" class="btn-delete" data-filename="{src_name}">Delete</button>
-                    <button type="button" class="dl dl-16">Download 16×16</button>
-                    <button type="button" class="dl dl-32">Download 32×32</button>
-                </div>
-            </div>''')
-    rows.append(add_row)
-
-    html = (
-        HTML_TEMPLATE.replace("__ASSET_ROWS__", "\n".join(rows))
-        .replace("__FIRST_ICON_LINKS__", first_links)
-        .replace("__FIRST_ICON_16__", first_16)
-        .replace("__FIRST_ICON_32__", first_32)
-    )
-    if inject_serve:
-        html = html.replace("<script>", "<script>window.__FAVICON_SERVE__=true;", 1)
-    (SCRIPT_DIR / OUT_HTML).write_text(html, encoding="utf-8")
-    print(f"Done. Open {SCRIPT_DIR / OUT_HTML} ({len(base_names)} assets).")
-    return len(base_names)
+            self.as_is.discard(src_name)
+
+    def remove(self, src_name: str) -> None:
+        self.rows.pop(src_name, None)
+        self.as_is.discard(src_name)
+        self.dupes.pop(src_name, None)
+
+    def sync(
+        self,
+        versions: dict[str, str],
+        as_is: set[str] | frozenset[str] = frozenset(),
+        dupes: dict[str, list[str]] | None = None,
+    ) -> None:
+        for name in [n for n in self.rows if n not in versions]:
+            self.remove(name)
+        self.rows.update(versions)
+        self.as_is = {n for n in as_is if n in versions}
+        self.dupes = {n: d for n, d in (dupes or {}).items() if n in versions}
+
+    def assets(self) -> list[list]:
+        # [name, version, atlas slot, 1 if shown as-is, [near-duplicate names]], trailing nulls dropped
+        slots = self.atlas["slots"] if self.atlas else {}
+        assets = []
+        for name in sorted(self.rows):
+            tail = [slots.get(name), 1 if name in self.as_is else None, self.dupes.get(name)]
+            while tail and tail[-1] is None:
+                tail.pop()
+            assets.append([name, self.rows[name], *tail])
+        return assets
+
+    def index(self, page_urls: list[str], inline: bool = False) -> dict:
+        index = {
+            "total": len(self.rows),
+            "pageSize": INDEX_PAGE_SIZE,
+            "sizes": list(self.sizes),
+            "preview": list(PREVIEW_SIZES),
+            "pages": page_urls,
+        }
+        if self.atlas:
+            index["atlas"] = {"columns": self.atlas["columns"], "sheets": self.atlas["sheets"]}
+        if inline:
+            index["assets"] = self.assets()
+        return index
+
+    def render(self, inject_serve: bool = False, page_urls: list[str] | None = None) -> str:
+        names = sorted(self.rows)
+        first = names[0] if names else None
+        first_links, first_16, first_32 = render_first_icon(first, self.rows[first] if first else "", first in self.as_is)
+        # Served pages fetch shards on demand; file:// pages cannot fetch, so they carry the whole index
+        index = self.index(page_urls or [], inline=not inject_serve)
+        index_json = json.dumps(index, separators=(",", ":")).replace("</", "<\\/")
+        html = (
+            HTML_TEMPLATE.replace("__ASSET_INDEX__", index_json)
+            .replace("__INDEX_META__", INDEX_META)
+            .replace("__ADD_ROW__", ADD_ROW)
+            .replace("__FIRST_ICON_LINKS__", first_links)
+            .replace("__FIRST_ICON_16__", first_16)
+            .replace("__FIRST_ICON_32__", first_32)
+        )
+        if inject_serve:
+            html = html.replace("<script>", "<script>window.__FAVICON_SERVE__=true;", 1)
+        return html
+
+    def write(self, inject_serve: bool = False) -> bool:
+        changed = False
+        if self.use_atlas:
+            with STATS.stage("atlas"):
+                self.atlas = build_atlas(self.rows, self.as_is)
+        else:
+            self.atlas = None
+        assets = self.assets()
+        previous = self._shards
+        shards = []
+        for start in range(0, len(assets), INDEX_PAGE_SIZE):
+            chunk = assets[start:start + INDEX_PAGE_SIZE]
+            path = SCRIPT_DIR / index_page_name(start // INDEX_PAGE_SIZE + 1)
+            n = start // INDEX_PAGE_SIZE
+            if previous and n < len(previous) and previous[n][:2] == (chunk, path):
+                shards.append(previous[n])
+                continue
+            with STATS.stage("index"):
+                blob = json.dumps({"assets": chunk}, separators=(",", ":")).encode()
+            changed |= write_if_changed(path, blob)
+            shards.append((chunk, path, f"{path.name}?v={hashlib.blake2b(blob, digest_size=6).hexdigest()}"))
+        page_urls = [url for _, _, url in shards]
+        keep = {path for _, path, _ in shards}
+        # Only the first write looks for leftovers on disk; after that the shards written last time are known
+        old = SCRIPT_DIR.glob("favicon-tester-index-*.json") if previous is None else [path for _, path, _ in previous]
+        for p in old:
+            if p not in keep and p.is_file():
+                p.unlink()
+                changed = True
+        self._shards = shards
+        meta = json.dumps(self.index(page_urls), separators=(",", ":")).encode()
+        changed |= write_if_changed(SCRIPT_DIR / INDEX_META, meta)
+        with STATS.stage("render"):
+            html = self.render(inject_serve, page_urls).encode("utf-8")
+        out = SCRIPT_DIR / OUT_HTML
+        if write_if_changed(out, html):
+            write_precompressed(out, html)
+            changed = True
+        return changed
+
+
+PAGE = Page()
+
+
+def generate(
+    check: bool,
+    force: bool,
+    inject_serve: bool = False,
+    jobs: int = 1,
+    sizes: tuple[int, ...] = SIZES,
+    atlas: bool = False,
+    bundle: str | None = None,
+    dedup: bool = False,
+    prune: bool = False,
+) -> FaviconProject:
+    # A CLI run is a full build of a project that shares PAGE; --watch and --serve carry on with the same project
+    started = time.perf_counter()
+    PAGE.configure(sizes, atlas)
+    project = FaviconProject(SCRIPT_DIR, sizes, jobs, atlas, OPTIMIZE, MAX_PIXELS, dedup, prune, PAGE, inject_serve, verbose=True)
+    try:
+        project.build(check=check, force=force)
+    except RuntimeError as e:
+        project.close()
+        raise SystemExit(str(e)) from None
+    entries = project.entries
+    sources = [project.sources[name] for name in sorted(PAGE.rows)]
+    if bundle is not None:
+        # "*" bundles every asset; a name bundles just that one and prints its <link> snippet
+        chosen = sources if bundle == "*" else [s for s in sources if s.name == bundle]
+        if not chosen:
+            project.close()
+            raise SystemExit(f"--bundle: no asset named {bundle}")
+        with STATS.stage("bundle"):
+            build_bundles(chosen, entries, force, jobs)
+        if bundle != "*" and (SCRIPT_DIR / BUNDLE_DIR / chosen[0].stem / "head.html").is_file():
+            print((SCRIPT_DIR / BUNDLE_DIR / chosen[0].stem / "head.html").read_text(encoding="utf-8"), end="")
+    note = "" if project.page_changed else ", unchanged"
+    finished = time.perf_counter()
+    print(f"Done. Open {SCRIPT_DIR / OUT_HTML} ({len(sources)} assets in {finished - started:.2f}s{note}).")
+    if STATS.enabled:
+        STATS.add_time("generate", started, finished)
+        STATS.report()
+    return project
+
+
+def update_sources(project: FaviconProject, names: set[str] | None) -> bool:
+    # Partial regeneration: only the named files are renamed, rebuilt and patched into the page.
+    # None means the watcher lost events, so the whole folder is rescanned.
+    project.build(None if names is None else sorted(names))
+    if project.page_changed:
+        print(f"Updated {OUT_HTML} ({len(project.page.rows)} assets).")
+    return project.page_changed
+
+
+_ACTIVE = threading.RLock()
+# Changed entries a long-lived pool may carry per task before its workers are restarted with the full manifest
+POOL_DELTA_MAX = 256
+
+
+class FaviconProject:
+    # Importable API for one asset folder. The scan, build manifest and page index stay in memory
+    # between calls. The module functions read SCRIPT_DIR, MAX_PIXELS and OPTIMIZE, so each call
+    # holds _ACTIVE and swaps this project's values in for its duration.
+    def __init__(
+        self,
+        root: str | Path,
+        sizes: tuple[int, ...] = SIZES,
+        jobs: int = 1,
+        atlas: bool = False,
+        optimize: bool = False,
+        max_pixels: int = MAX_PIXELS,
+        dedup: bool = False,
+        prune: bool = False,
+        page: Page | None = None,
+        inject_serve: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        # page and inject_serve let the CLI keep its module-level PAGE in step with the project. Progress
+        # lines are discarded unless verbose, since a library caller's stdout is not a terminal log.
+        self.root = Path(root).resolve()
+        if not self.root.is_dir():
+            raise NotADirectoryError(str(self.root))
+        if optimize and Image is None:
+            raise RuntimeError("optimize needs Pillow: pip install Pillow")
+        self.jobs = jobs
+        self.optimize = optimize
+        self.max_pixels = max_pixels
+        self.dedup = dedup
+        self.prune = prune
+        self.page = page if page is not None else Page(tuple(sorted(set(sizes) | {16, 32})), atlas)
+        self.inject_serve = inject_serve
+        self.verbose = verbose
+        self.page_changed = False
+        self.sources: dict[str, Path] | None = None
+        self.index: DirIndex | None = None
+        self.entries: dict[str, dict] | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._delta: dict[str, dict] = {}
+        self._stamp: tuple | None = None
+
+    @contextmanager
+    def _active(self):
+        # The module functions report fatal errors with SystemExit, which library callers get as RuntimeError
+        global SCRIPT_DIR, MAX_PIXELS, OPTIMIZE
+        with _ACTIVE, (nullcontext() if self.verbose else redirect_stdout(io.StringIO())):
+            saved = SCRIPT_DIR, MAX_PIXELS, OPTIMIZE
+            SCRIPT_DIR, MAX_PIXELS, OPTIMIZE = self.root, self.max_pixels, self.optimize
+            try:
+                yield
+            except SystemExit as e:
+                raise RuntimeError(str(e)) from None
+            finally:
+                SCRIPT_DIR, MAX_PIXELS, OPTIMIZE = saved
+
+    @staticmethod
+    def _check_names(names: list[str]) -> None:
+        # Names are joined onto the project folder, so only plain file names in it are accepted
+        if isinstance(names, str):
+            raise ValueError("names must be a list of file names")
+        for name in names:
+            if not isinstance(name, str) or name in ("", ".", "..") or Path(name).name != name:
+                raise ValueError(f"not a file name in the project folder: {name!r}")
+
+    def _worker_pool(self) -> ProcessPoolExecutor | None:
+        # Workers get the manifest once at start-up and later changes as a per-task delta, until it outgrows POOL_DELTA_MAX
+        if self.jobs == 1:
+            return None
+        if self._pool is not None and len(self._delta) > POOL_DELTA_MAX:
+            self.close()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.jobs if self.jobs > 0 else None,
+                initializer=_init_worker,
+                initargs=(self.entries, STATS.enabled, worker_pixels(self.max_pixels, self.jobs), self.optimize, self.root),
+            )
+            self._delta = {}
+        return self._pool
+
+    def close(self) -> None:
+        # Shut down the worker pool; the project stays usable and starts a new pool when needed
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def scan(self) -> list[str]:
+        # Rename new uploads to favicon-test-NN and return the asset names
+        with self._active():
+            self.index = DirIndex(self.root)
+            rename_non_favicon(self.index.sources(), self.index)
+            self.sources = {p.name: p for p in self.index.sources()}
+            return sorted(self.sources)
+
+    def build(self, names: list[str] | None = None, check: bool = True, force: bool = False) -> dict[str, str]:
+        # Build every asset, or only the named files, and rewrite the page. Returns name -> version for what was built.
+        # A partial build stats, journals and rewrites index shards for the named files only.
+        if names is not None:
+            self._check_names(names)
+        with self._active():
+            if names is None or self.sources is None:
+                self.scan()
+            if names is None:
+                todo = list(self.sources.values())
+            else:
+                self.index.refresh(set(names))
+                if not any(n in self.index.files or n in self.sources for n in names):
+                    self.page_changed = False
+                    return {}  # only outputs or other non-source files changed
+                present = [self.root / n for n in sorted(set(names)) if n in self.index.files]
+                for name in names:
+                    self.sources.pop(name, None)
+                    self.page.remove(name)
+                todo = [p for p in present if p.name.startswith("favicon-")]
+                todo += rename_non_favicon([p for p in present if not p.name.startswith("favicon-")], self.index)
+                self.sources.update((p.name, p) for p in todo)
+            todo.sort()
+            if self.entries is None:
+                self.entries = load_manifest()
+                self._stamp = manifest_stamp()
+            before = {p.name: self.entries.get(p.name) for p in todo}
+            pool = self._worker_pool() if len(todo) > 1 else None
+            with STATS.stage("build"):
+                entries = build_all(todo, check, force, self.jobs, self.page.sizes, self.entries, self.index.files, pool, self._delta)
+            changed = [n for n, old in before.items() if entries[n] != old]
+            if self.dedup or self.prune:
+                # New files are grouped against every asset; the perceptual hashes are in memory, so no file is read
+                changed = sorted(set(changed) | set(ensure_phashes(list(self.sources.values()), entries)))
+            if names is None:
+                save_manifest(entries)
+            else:
+                append_manifest(entries, changed)
+            self._stamp = manifest_stamp()
+            if self._pool is not None:
+                self._delta.update((n, entries[n]) for n in changed)
+            if names is None or self.dedup or self.prune:
+                self._sync_page(None if names is None else {p.name for p in todo})
+            else:
+                for p in todo:
+                    self.page.add(p.name, asset_version(entries, p.name), is_shown_as_is(entries, p.name))
+            self.page_changed = self.page.write(self.inject_serve)
+            return {p.name: asset_version(entries, p.name) for p in todo if p.name in self.sources}
 
+    def _sync_page(self, announce: set[str] | None = None) -> None:
+        # Rows for every built source, regrouped (or pruned) by perceptual hash when dedup is on
+        entries = self.entries
+        shown, dupes = [p for p in self.sources.values() if p.name in entries], {}
+        if self.dedup or self.prune:
+            kept, dupes = dedup_sources(shown, entries, self.prune, announce)
+            if self.prune:
+                kept_names = {p.name for p in kept}
+                pruned = [p.name for p in shown if p.name not in kept_names]
+                for name in pruned:
+                    self.sources.pop(name, None)
+                self.index.refresh(pruned)
+            shown = kept
+        self.page.sync(
+            {p.name: asset_version(entries, p.name) for p in shown},
+            {p.name for p in shown if is_shown_as_is(entries, p.name)},
+            dupes,
+        )
 
-def serve() -> None:
+    def delete(self, name: str) -> bool:
+        # Remove an asset and its outputs, then rewrite the page. False if there was no such file
+        self._check_names([name])
+        if not name.startswith("favicon-"):
+            raise ValueError(f"not an asset name: {name!r}")
+        with self._active():
+            if not (self.root / name).is_file():
+                return False
+            do_delete(name, announce=False)
+            self._forget(name)
+            self.page_changed = self.page.write(self.inject_serve)
+            return True
+
+    def forget(self, name: str, resync: bool = True) -> None:
+        # Drop a source that is already gone from disk, e.g. deleted by the server, and rewrite the page. With
+        # resync, rows are reloaded from disk first if another process wrote the manifest since this project did.
+        self._check_names([name])
+        with self._active():
+            if resync and self._stamp is not None and manifest_stamp() != self._stamp:
+                self._resync()
+            self._forget(name)
+            self.page_changed = self.page.write(self.inject_serve)
+
+    def _forget(self, name: str) -> None:
+        self.page.remove(name)
+        if self.sources is not None:
+            self.sources.pop(name, None)
+            self.index.refresh([name])
+            if self.entries is not None and (self.dedup or self.prune):
+                # Copies hidden behind the deleted row get a row again, or regroup under another copy
+                self._sync_page(announce=set())
+
+    def _resync(self) -> None:
+        # One scandir and a manifest reload; workers started with the old manifest are retired
+        self.close()
+        self.entries = load_manifest()
+        self._stamp = manifest_stamp()
+        self.scan()
+        self._sync_page(announce=set())
+
+    def render_html(self) -> str:
+        # The tester page for the current index, with the asset list inline
+        with self._active():
+            return self.page.render()
+
+
+def daemon(project: FaviconProject) -> None:
+    # Line-delimited JSON-RPC 2.0 on stdin/stdout, one project per process. Build progress is
+    # redirected to stderr so stdout carries only responses.
+    methods = {"scan": project.scan, "build": project.build, "delete": project.delete, "render_html": project.render_html}
+    out = sys.stdout
+    with redirect_stdout(sys.stderr):
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                reply = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}}
+            else:
+                method = methods.get(request.get("method")) if isinstance(request, dict) else None
+                params = request.get("params", {}) if isinstance(request, dict) else None
+                reply = {"jsonrpc": "2.0", "id": request.get("id") if isinstance(request, dict) else None}
+                if method is None:
+                    reply["error"] = {"code": -32601, "message": "Method not found"}
+                elif not isinstance(params, (list, dict)):
+                    reply["error"] = {"code": -32602, "message": "Invalid params"}
+                else:
+                    try:
+                        reply["result"] = method(*params) if isinstance(params, list) else method(**params)
+                    except (TypeError, ValueError) as e:
+                        reply["error"] = {"code": -32602, "message": str(e)}
+                    except (Exception, SystemExit) as e:
+                        reply["error"] = {"code": -32000, "message": str(e)}
+                if isinstance(request, dict) and "id" not in request:
+                    continue  # notification
+            out.write(json.dumps(reply) + "\n")
+            out.flush()
+    project.close()
+
+
+def _inotify_batches(debounce: float):
+    import ctypes
+    import ctypes.util
+    import select
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(SCRIPT_DIR), 0x008 | 0x040 | 0x080 | 0x200) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+    try:
+        while True:
+            pending: set[str] = set()
+            overflow = False
+            timeout = None
+            while select.select([fd], [], [], timeout)[0]:
+                buf = os.read(fd, 64 * 1024)
+                i = 0
+                while i < len(buf):
+                    _, mask, _, size = struct.unpack_from("iIII", buf, i)
+                    name = buf[i + 16:i + 16 + size].rstrip(b"\0").decode(errors="surrogateescape")
+                    i += 16 + size
+                    if mask & 0x4000:  # IN_Q_OVERFLOW: the kernel dropped events
+                        overflow = True
+                    elif is_source(name):
+                        pending.add(name)
+                timeout = debounce
+            if overflow:
+                yield None
+            elif pending:
+                yield pending
+    finally:
+        os.close(fd)
+
+
+def _poll_batches(interval: float):
+    def snapshot() -> dict[str, tuple[int, int]]:
+        return DirIndex(SCRIPT_DIR).files
+
+    seen = snapshot()
+    pending: set[str] = set()
+    while True:
+        time.sleep(interval)
+        now = snapshot()
+        changed = {n for n in seen.keys() | now.keys() if seen.get(n) != now.get(n)}
+        seen = now
+        if changed:
+            pending |= changed
+        elif pending:
+            yield pending
+            pending = set()
+
+
+def watch_batches(debounce: float = WATCH_DEBOUNCE, interval: float = WATCH_POLL_INTERVAL):
+    # Yields sets of changed source names, or None when events were lost and the folder needs a full rescan
+    if sys.platform.startswith("linux"):
+        try:
+            yield from _inotify_batches(debounce)
+            return
+        except OSError as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s")
+    yield from _poll_batches(interval)
+
+
+def watch(project: FaviconProject) -> None:
+    # Batches go through the project generate() built, so the folder index and manifest stay in memory between them
+    print(f"Watching {SCRIPT_DIR} for new or changed images. Ctrl+C to stop.")
+    try:
+        for names in watch_batches():
+            update_sources(project, names)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        project.close()
+
+
+class Notifier:
+    # Version counter that SSE clients block on until assets change
+    def __init__(self) -> None:
+        self.version = 0
+        self.cond = threading.Condition()
+
+    def bump(self) -> None:
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+def serve(project: FaviconProject, watch_files: bool = False) -> None:
+    import email.utils
     import http.server
     import urllib.parse
+    from concurrent.futures import ThreadPoolExecutor
+
+    notifier = Notifier()
+    # One regeneration thread: PAGE is only mutated here, never on a request thread
+    regen_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="regen")
+
+    def regen(fn, *args) -> None:
+        def run() -> None:
+            try:
+                changed = fn(*args)
+            except Exception as e:
+                print(f"Regeneration failed: {e}")
+                return
+            if changed:
+                notifier.bump()
+
+        regen_pool.submit(run)
+
+    def remove_row(name: str) -> bool:
+        # Patches only this row. Without --watch, the project also resyncs if a CLI run rewrote the manifest meanwhile;
+        # with it, the watcher already feeds the project every change.
+        project.forget(name, resync=not watch_files)
+        return project.page_changed
+
+    etags: dict[str, tuple[int, int, str]] = {}
+    latency = Histogram()
+
+    def route_of(path: str) -> str:
+        if path in ("/delete", "/metrics"):
+            return path[1:]
+        if path.endswith(".html") or path == "/":
+            return "page"
+        return "index" if path.endswith(".json") else "asset"
+
+    def etag_for(path: str, st: os.stat_result) -> str:
+        # Strong ETag from the content hash; rehash only when size or mtime moves
+        cached = etags.get(path)
+        if cached is None or cached[:2] != (st.st_mtime_ns, st.st_size):
+            cached = (st.st_mtime_ns, st.st_size, file_hash(Path(path)))
+            etags[path] = cached
+        return f'"{cached[2]}"'
 
     class Handler(http.server.SimpleHTTPRequestHandler):
         def __init__(self, *args, **kwargs):
             super().__init__(*args, directory=str(SCRIPT_DIR), **kwargs)
 
+        def handle_one_request(self):
+            started = time.perf_counter()
+            super().handle_one_request()
+            path = urllib.parse.urlsplit(getattr(self, "path", "") or "").path
+            # SSE streams stay open for the life of the tab, so they would swamp the histogram
+            if path and path != "/events":
+                latency.observe(route_of(path), time.perf_counter() - started)
+
+        def do_GET(self):
+            if self.path == "/events":
+                self.send_events()
+                return
+            if self.path == "/metrics":
+                self.send_metrics()
+                return
+            super().do_GET()
+
+        def send_metrics(self):
+            lines = latency.render("favicon_request_duration_seconds")
+            lines.append("# TYPE favicon_assets gauge")
+            lines.append(f"favicon_assets {len(PAGE.rows)}")
+            snap = STATS.snapshot()
+            if snap["stages"]:
+                lines.append("# TYPE favicon_stage_seconds_total counter")
+                lines += [f'favicon_stage_seconds_total{{stage="{k}"}} {v[0]:.6f}' for k, v in sorted(snap["stages"].items())]
+            for key, n in sorted(snap["counters"].items()):
+                lines.append(f"# TYPE favicon_{key}_total counter")
+                lines.append(f"favicon_{key}_total {n}")
+            body = ("\n".join(lines) + "\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_head(self):
+            path = self.translate_path(self.path)
+            if not os.path.isfile(path):
+                return super().send_head()
+            st = os.stat(path)
+            etag = etag_for(path, st)
+            body, encoding = path, None
+            if path.endswith(PRECOMPRESS_EXTS):
+                accept = self.headers.get("Accept-Encoding", "")
+                for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+                    try:
+                        fresh = enc in accept and os.stat(path + ext).st_mtime_ns >= st.st_mtime_ns
+                    except OSError:
+                        fresh = False
+                    if fresh:
+                        body, encoding = path + ext, enc
+                        etag = f'{etag[:-1]}-{enc}"'
+                        break
+            # ?v= URLs are content-addressed, so they never need revalidation
+            versioned = "v" in urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            cache_control = "public, max-age=31536000, immutable" if versioned else "no-cache"
+            inm = self.headers.get("If-None-Match")
+            if inm is not None:
+                not_modified = etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*"
+            else:
+                not_modified = False
+                ims = self.headers.get("If-Modified-Since")
+                if ims:
+                    try:
+                        not_modified = int(st.st_mtime) <= email.utils.parsedate_to_datetime(ims).timestamp()
+                    except (TypeError, ValueError, IndexError, OverflowError):
+                        pass
+            if not_modified:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", cache_control)
+                self.end_headers()
+                return None
+            f = open(body, "rb")
+            self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.send_header("Last-Modified", self.date_time_string(int(st.st_mtime)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            if path.endswith(PRECOMPRESS_EXTS):
+                self.send_header("Vary", "Accept-Encoding")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.end_headers()
+            return f
+
+        def send_events(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            seen = notifier.version
+            try:
+                while True:
+                    version = notifier.wait(seen, 15)
+                    if version == seen:
+                        self.wfile.write(b": ping\n\n")
+                    else:
+                        seen = version
+                        self.wfile.write(f"event: assets\ndata: {version}\n\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
         def do_POST(self):
             if self.path.startswith("/delete"):
                 parsed = urllib.parse.urlparse(self.path)
@@ -430,10 +2095,10 @@ def serve() -> None:
                     return
                 try:
                     do_delete(name)
-                    generate(check=False, force=True, inject_serve=True)
                 except Exception as e:
                     self.send_error(500, str(e))
                     return
+                regen(remove_row, name)
                 self.send_response(200)
                 self.send_header("Content-Type", "application/json")
                 self.end_headers()
@@ -444,22 +2109,39 @@ def serve() -> None:
         def log_message(self, format, *args):
             pass
 
-    with http.server.HTTPServer(("127.0.0.1", PORT), Handler) as httpd:
+    if watch_files:
+        def watch_loop() -> None:
+            for names in watch_batches():
+                regen(update_sources, project, names)
+
+        threading.Thread(target=watch_loop, name="watch", daemon=True).start()
+
+    with http.server.ThreadingHTTPServer(("127.0.0.1", PORT), Handler) as httpd:
         print(f"Open: http://127.0.0.1:{PORT}/favicon-tester.html")
         print("Delete button will remove files from disk. Ctrl+C to stop.")
-        httpd.serve_forever()
+        try:
+            httpd.serve_forever()
+        finally:
+            regen_pool.shutdown(wait=False, cancel_futures=True)
+            project.close()
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Favicon tool: generate tester HTML and optionally serve it.")
-    parser.add_argument("--check", action="store_true", help="Only regenerate if source newer")
-    parser.add_argument("--force", action="store_true", help="Regenerate all")
-    parser.add_argument("--clean", action="store_true", help="Remove only -16x16/-32x32")
-    parser.add_argument("--clean-all", action="store_true", help="Remove all favicon-* assets")
-    parser.add_argument("--delete", metavar="FILE", help="Delete one asset, then regenerate")
-    parser.add_argument("--serve", action="store_true", help="Generate then serve (Delete removes files)")
-    args = parser.parse_args()
+def parse_sizes(text: str) -> tuple[int, ...]:
+    try:
+        sizes = {int(part) for part in text.split(",") if part.strip()}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated pixel sizes, got {text!r}")
+    if any(n < 1 or n > 1024 for n in sizes):
+        raise argparse.ArgumentTypeError("sizes must be between 1 and 1024")
+    return tuple(sorted(sizes | {16, 32}))
+
 
+def run(args: argparse.Namespace) -> None:
+    global MAX_PIXELS, OPTIMIZE
+    MAX_PIXELS = args.max_pixels
+    if args.optimize and Image is None:
+        raise SystemExit("--optimize needs Pillow: pip install Pillow")
+    OPTIMIZE = args.optimize
     if args.delete:
         do_delete(args.delete)
     if args.clean_all:
@@ -468,11 +2150,92 @@ def main() -> None:
     if args.clean:
         do_clean()
         return
+    if args.daemon:
+        project = FaviconProject(
+            SCRIPT_DIR, args.sizes, args.jobs, args.atlas, args.optimize, args.max_pixels, args.dedup, args.dedup_prune, verbose=True
+        )
+        daemon(project)
+        return
     if args.serve:
-        generate(check=args.check, force=args.force, inject_serve=True)
-        serve()
+        project = generate(
+            check=args.check,
+            force=args.force,
+            inject_serve=True,
+            jobs=args.jobs,
+            sizes=args.sizes,
+            atlas=args.atlas,
+            bundle=args.bundle,
+            dedup=args.dedup,
+            prune=args.dedup_prune,
+        )
+        serve(project, watch_files=args.watch)
+        return
+    project = generate(
+        check=args.check,
+        force=args.force,
+        jobs=args.jobs,
+        sizes=args.sizes,
+        atlas=args.atlas,
+        bundle=args.bundle,
+        dedup=args.dedup,
+        prune=args.dedup_prune,
+    )
+    if args.watch:
+        watch(project)
+    else:
+        project.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Favicon tool: generate tester HTML and optionally serve it.")
+    parser.add_argument("--check", action="store_true", help="Only regenerate if source content changed")
+    parser.add_argument("--force", action="store_true", help="Regenerate all")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Resize with N worker processes (0 = one per CPU)")
+    parser.add_argument("--sizes", type=parse_sizes, default=SIZES, metavar="N,N,...", help="Size tiers to generate (default 16,32,48,64)")
+    parser.add_argument(
+        "--max-pixels", type=int, default=MAX_PIXELS, metavar="N", help="Pillow decode budget in pixels, split across --jobs workers; larger sources use ImageMagick"
+    )
+    parser.add_argument("--optimize", action="store_true", help="Losslessly recompress PNG outputs (palette when exact, max deflate)")
+    parser.add_argument("--atlas", action="store_true", help="Pack 16/32 previews into sprite sheets (needs Pillow)")
+    parser.add_argument(
+        "--bundle", nargs="?", const="*", metavar="ASSET", help="Write favicon.ico, touch/PWA icons and site.webmanifest (all assets, or one)"
+    )
+    parser.add_argument("--dedup", action="store_true", help="Show near-identical icons (perceptual hash) as one row")
+    parser.add_argument("--dedup-prune", action="store_true", help="Delete near-identical copies, keeping an SVG or the largest file")
+    parser.add_argument("--stats", action="store_true", help="Print per-stage timings, resize paths and bytes read/written")
+    parser.add_argument("--profile", metavar="FILE", help="With --stats: write cProfile data (.prof) or a Chrome trace (.json)")
+    parser.add_argument("--clean", action="store_true", help="Remove only generated -NxN.png outputs")
+    parser.add_argument("--clean-all", action="store_true", help="Remove all favicon-* assets")
+    parser.add_argument("--delete", metavar="FILE", help="Delete one asset, then regenerate")
+    parser.add_argument("--watch", action="store_true", help="Generate, then rebuild files as they are added or changed")
+    parser.add_argument("--daemon", action="store_true", help="Answer JSON-RPC requests on stdin (scan, build, delete, render_html)")
+    parser.add_argument("--serve", action="store_true", help="Generate then serve (Delete removes files; with --watch, pages update live)")
+    args = parser.parse_args()
+
+    STATS.enabled = args.stats or bool(args.profile)
+    if not args.profile:
+        run(args)
         return
-    generate(check=args.check, force=args.force)
+    out = Path(args.profile)
+    if out.suffix == ".json":
+        STATS.trace = True
+        try:
+            run(args)
+        finally:
+            STATS.write_trace(out)
+            print(f"Wrote trace {out} (open in chrome://tracing or ui.perfetto.dev)")
+        return
+    import cProfile
+
+    # cProfile sees the main process only; worker time shows up in --stats and the .json trace
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        run(args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(out)
+        print(f"Wrote profile {out} (python3 -m pstats {out})")
 
 
 if __name__ == "__main__":